@@ -1,23 +1,69 @@
 import logging
+import os
 import time
+import zlib
+import numpy as np
 import config_manager as cfg
 from utils import send_notification
 
 # Conditional import for type hinting if needed
 try:
     from faster_whisper import WhisperModel
+    from faster_whisper.tokenizer import Tokenizer
     faster_whisper_available = True
 except ImportError:
     logging.error("faster-whisper library is required but not installed.")
     faster_whisper_available = False
 
+# Optional in-process decoding of audio files, so ffmpeg is only spawned for formats soundfile can't read
+try:
+    import soundfile as sf
+    soundfile_available = True
+except ImportError:
+    soundfile_available = False
+try:
+    import soxr
+    soxr_available = True
+except ImportError:
+    soxr_available = False
+
+WHISPER_SAMPLE_RATE = 16000 # faster-whisper expects in-memory audio at this rate
+# faster-whisper's defaults for judging a decode (see WhisperModel.generate_with_fallback)
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+COMPRESSION_RATIO_THRESHOLD = 2.4
+FALLBACK_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
 class WhisperProcessor:
     def __init__(self):
         self.model = None
         self.model_size = cfg.get_setting('Whisper', 'model_size')
         self.device = cfg.get_setting('Whisper', 'device')
         self.compute_type = cfg.get_setting('Whisper', 'compute_type')
-        self.beam_size = cfg.get_int_setting('Whisper', 'beam_size')
+        if self.compute_type.lower() in ('', 'auto', 'default'):
+            # CTranslate2's quantized paths: int8 weights on CPU, int8 weights + fp16 activations on GPU
+            self.compute_type = 'int8_float16' if self.device == 'cuda' else 'int8'
+        self.cpu_threads = cfg.VALUES.cpu_threads or max(1, (os.cpu_count() or 2) // 2)
+        self.beam_size = cfg.VALUES.beam_size
+        self.greedy = cfg.VALUES.greedy
+        self.language = cfg.get_setting('Whisper', 'language') or None # None lets Whisper detect it
+        self.decode_in_process = cfg.VALUES.decode_in_process and soundfile_available
+
+        # Decoding options for short, VAD-cut utterances. VAD already ran upstream,
+        # so faster-whisper's own VAD pass is disabled. Beam search is opt-in (greedy = false).
+        self.transcribe_options = {
+            'beam_size': 1 if self.greedy else self.beam_size,
+            'best_of': 1,
+            'temperature': 0.0,
+            'condition_on_previous_text': False,
+            'without_timestamps': True,
+            'vad_filter': False,
+            'language': self.language,
+        }
+
+        # Short-segment fast path state, set up once the model is loaded
+        self._mel = None # Preallocated 30s log-mel buffer fed to the encoder
+        self._prompts = {} # language -> (Tokenizer, prompt token ids)
         self.load_model()
 
     def load_model(self):
@@ -29,14 +75,22 @@ class WhisperProcessor:
             logging.info("Whisper model already loaded.")
             return True
 
-        logging.info(f"Loading Whisper model: {self.model_size} (Device: {self.device}, Compute: {self.compute_type})")
+        logging.info(f"Loading Whisper model: {self.model_size} (Device: {self.device}, Compute: {self.compute_type}, CPU threads: {self.cpu_threads})")
         send_notification("ASR Engine", f"Loading model: {self.model_size}...", icon_name_cfg_key='processing')
         start_time = time.time()
         try:
             self.model = WhisperModel(self.model_size,
                                       device=self.device,
-                                      compute_type=self.compute_type)
+                                      compute_type=self.compute_type,
+                                      cpu_threads=self.cpu_threads,
+                                      num_workers=1) # Segments are transcribed one at a time
                                       # Optional: download_root=cfg.get_setting('Paths','model_cache'))
+            feature_extractor = self.model.feature_extractor
+            self._mel = np.zeros((feature_extractor.mel_filters.shape[0], feature_extractor.nb_max_frames), dtype=np.float32)
+            self._prompts = {}
+            if self.language or not self.model.model.is_multilingual:
+                self._get_prompt(self.language or 'en') # Build the tokenizer and prompt up front
+            self._warm_up()
             load_time = time.time() - start_time
             logging.info(f"Model loaded in {load_time:.2f} seconds.")
             # send_notification("ASR Engine", "Model Ready", icon_name_cfg_key='success') # Can be noisy
@@ -47,25 +101,123 @@ class WhisperProcessor:
             self.model = None
             return False
 
-    def transcribe(self, audio_filepath):
+    def _warm_up(self):
+        """Runs one dummy transcription so kernel setup and allocator pools are paid at startup, not on the first utterance."""
+        try:
+            self._transcribe_short(np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32))
+        except Exception as e:
+            logging.warning(f"Whisper warm-up failed (first transcription may be slower): {e}")
+
+    def _get_prompt(self, language):
+        """Returns the cached (tokenizer, prompt tokens) for a language, building them on first use."""
+        cached = self._prompts.get(language)
+        if cached is None:
+            tokenizer = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                                  task='transcribe', language=language)
+            cached = (tokenizer, list(tokenizer.sot_sequence) + [tokenizer.no_timestamps])
+            self._prompts[language] = cached
+        return cached
+
+    def _transcribe_short(self, audio):
+        """Transcribes up to 30s of audio with one encoder pass and one generate call.
+
+        Skips faster-whisper's segment/seek loop, which only pays off for long audio.
+        The encoder runs on a reused mel buffer and the prompt tokens are cached.
+        Applies faster-whisper's quality checks to the greedy result: returns '' for
+        silence, and None if the decode looks unreliable, so the caller retries it
+        through model.transcribe() with temperature fallback.
+        """
+        features = self.model.feature_extractor(audio)
+        frames = min(features.shape[-1], self._mel.shape[-1])
+        self._mel[:, :frames] = features[:, :frames]
+        self._mel[:, frames:] = 0.0 # Pad to the fixed 30s window like pad_or_trim
+        encoder_output = self.model.encode(self._mel)
+
+        language = self.language
+        if language is None:
+            if self.model.model.is_multilingual:
+                language_token, _ = self.model.model.detect_language(encoder_output)[0][0]
+                language = language_token[2:-2] # '<|en|>' -> 'en'
+            else:
+                language = 'en'
+        tokenizer, prompt = self._get_prompt(language)
+
+        result = self.model.model.generate(encoder_output, [prompt],
+                                           beam_size=self.transcribe_options['beam_size'],
+                                           max_length=self.model.max_length,
+                                           suppress_blank=True,
+                                           suppress_tokens=[-1],
+                                           return_scores=True,
+                                           return_no_speech_prob=True)[0]
+        tokens = result.sequences_ids[0]
+        text = tokenizer.decode(tokens).strip()
+        # Same measures as generate_with_fallback (length_penalty 1: scores are per-token averages)
+        avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+            logging.debug("Segment judged silent (no_speech_prob %.2f, avg_logprob %.2f).", result.no_speech_prob, avg_logprob)
+            return ''
+        encoded = text.encode('utf-8')
+        if avg_logprob < LOG_PROB_THRESHOLD or (encoded and len(encoded) / len(zlib.compress(encoded)) > COMPRESSION_RATIO_THRESHOLD):
+            logging.debug("Low-confidence greedy decode (avg_logprob %.2f), retrying with temperature fallback.", avg_logprob)
+            return None
+        logging.debug("Transcribed %.2fs of audio. Language: %s", len(audio) / WHISPER_SAMPLE_RATE, language)
+        return text
+
+    def _read_audio(self, path):
+        """Decodes an audio file to 16 kHz mono float32 with soundfile (and soxr if it needs resampling).
+
+        Returns None if the file can't be handled here, so faster-whisper decodes it with ffmpeg instead.
+        """
+        try:
+            data, sr = sf.read(path, dtype='float32', always_2d=False)
+        except Exception as e:
+            logging.debug(f"soundfile could not read {path}, falling back to ffmpeg: {e}")
+            return None
+        if data.ndim > 1:
+            data = data.mean(axis=1, dtype=np.float32)
+        if sr != WHISPER_SAMPLE_RATE:
+            if not soxr_available:
+                return None
+            data = soxr.resample(data, sr, WHISPER_SAMPLE_RATE)
+        return data
+
+    def transcribe(self, audio):
+        """Transcribes a file path or a float32 mono numpy array sampled at 16 kHz.
+
+        Arrays are handed to faster-whisper as-is, which skips the ffmpeg decode
+        and resample it performs for file input.
+        """
         if self.model is None:
             logging.error("Transcription failed: Model not loaded.")
             # Attempt to reload?
             if not self.load_model(): # Try loading again
                  return None
 
-        logging.info(f"Starting transcription for: {audio_filepath}")
+        if isinstance(audio, np.ndarray):
+            logging.info(f"Starting transcription of {len(audio) / WHISPER_SAMPLE_RATE:.2f}s in-memory segment.")
+        else:
+            logging.info(f"Starting transcription for: {audio}")
+            if self.decode_in_process:
+                decoded = self._read_audio(audio)
+                if decoded is not None:
+                    audio = decoded # Now takes the in-memory path below
         send_notification("ASR Processing", "Transcribing audio...", icon_name_cfg_key='processing')
         start_time = time.time()
         try:
-            segments, info = self.model.transcribe(audio_filepath, beam_size=self.beam_size)
+            full_text = None
+            options = self.transcribe_options
+            if isinstance(audio, np.ndarray) and len(audio) <= self.model.feature_extractor.n_samples:
+                full_text = self._transcribe_short(audio)
+                options = {**options, 'temperature': FALLBACK_TEMPERATURES} # Only reached if the fast decode was rejected
+            if full_text is None:
+                segments, info = self.model.transcribe(audio, **options) # Drops no-speech segments itself
 
-            # Use generator expression for efficiency
-            full_text = "".join(segment.text for segment in segments).strip()
+                # Use generator expression for efficiency
+                full_text = "".join(segment.text for segment in segments).strip()
+                logging.debug("Transcribed %.2fs of audio. Language: %s", info.duration, info.language)
 
-            duration = info.duration
             transcribe_time = time.time() - start_time
-            logging.info(f"Transcription complete ({duration:.2f}s audio in {transcribe_time:.2f}s). Language: {info.language}")
+            logging.info(f"Transcription complete in {transcribe_time:.2f}s.")
             return full_text
 
         except Exception as e:
@@ -1,37 +1,36 @@
 import sounddevice as sd
-import soundfile as sf
 import numpy as np
-import torch
 import threading
 import queue
 import logging
 import time
 import os
-import collections # For deque
 import config_manager as cfg
+from spsc_ring import SampleRing, SegmentRing
+from vad import SileroVAD, default_model_path
 from utils import send_notification, logger # Use the shared logger
 
 # --- Silero VAD Setup ---
 try:
-    # VAD Model downloaded automatically by torch.hub
-    vad_model, utils = torch.hub.load(repo_or_dir='snakers4/silero-vad',
-                                      model='silero_vad',
-                                      force_reload=False, # Set to True to redownload model
-                                      onnx=True) # Use ONNX for potentially better CPU performance
-    (get_speech_timestamps,
-     save_audio,
-     read_audio,
-     VADIterator,
-     collect_chunks) = utils
-    # Pass threshold directly if needed later: VADIterator(vad_model, threshold=cfg.get_float_setting('VAD', 'speech_threshold'))
-    vad_iterator = VADIterator(vad_model)
+    vad_model_path = os.path.expanduser(cfg.get_setting('VAD', 'model_path'))
+    if not vad_model_path:
+        vad_model_path = default_model_path(cfg.CACHE_DIR)
+    logger.info(f"Loading Silero VAD model from {vad_model_path}")
+    vad_providers = [p.strip() for p in cfg.get_setting('VAD', 'providers').split(',') if p.strip()]
+    vad_model = SileroVAD(vad_model_path, cfg.VALUES.sample_rate, providers=vad_providers)
     silero_vad_available = True
-    logger.info("Silero VAD model loaded successfully.")
+    logger.info(f"Silero VAD model loaded successfully (providers: {', '.join(vad_model.session.get_providers())}).")
 except Exception as e:
     logger.error(f"Failed to load Silero VAD model: {e}", exc_info=True)
     logger.error("VAD-based streaming will not work. Install requirements.")
     silero_vad_available = False
-    vad_iterator = None
+    vad_model = None
+
+MAX_SEGMENT_SECONDS = 30 # Whisper's window; longer speech is queued in pieces
+SEGMENT_ARENA_SECONDS = 120 # Audio that can be queued or in transcription at once
+AUDIO_RING_FRAMES = 64 # VAD frames (~2s at 32ms) the callback can run ahead of the VAD worker
+VAD_MAX_BATCH_FRAMES = 16 # Frames the VAD worker drains and scores per wakeup
+VAD_NEG_THRESHOLD_OFFSET = 0.15 # Hysteresis: speech ends below threshold - offset (as Silero's VADIterator)
 
 class AudioRecorder:
     def __init__(self, transcription_queue):
@@ -44,38 +43,75 @@ class AudioRecorder:
         self.is_recording_active = False # Different from main 'asr_active' state
 
         # --- Audio Config ---
-        self.samplerate = cfg.get_int_setting('Audio', 'sample_rate')
-        self.channels = cfg.get_int_setting('Audio', 'channels')
+        self.samplerate = cfg.VALUES.sample_rate
+        self.channels = cfg.VALUES.channels
         self.device = cfg.get_setting('Audio', 'input_device')
         if self.device.lower() == 'default' or not self.device:
             self.device = None # sounddevice uses default if None
+        if self.samplerate != 16000:
+            # Segments are passed to Whisper in memory without resampling
+            logger.warning(f"Whisper expects 16000Hz audio, configured sample_rate is {self.samplerate}. Transcription quality will suffer.")
 
         # --- VAD Config ---
-        self.vad_threshold = cfg.get_float_setting('VAD', 'speech_threshold')
-        self.vad_frame_ms = cfg.get_int_setting('VAD', 'frame_ms')
-        # Calculate frame size based on VAD expectation and sample rate
-        self.vad_frame_size = int(self.samplerate * self.vad_frame_ms / 1000)
-        self.min_silence_duration_ms = cfg.get_int_setting('VAD', 'silence_duration_ms')
+        self.vad_threshold = cfg.VALUES.speech_threshold
+        self.vad_frame_ms = cfg.VALUES.frame_ms
+        # Frame size derived from sample_rate and frame_ms when the config was loaded
+        self.vad_frame_size = cfg.VALUES.vad_frame_size
+        if self.vad_frame_size != vad_model.window_size:
+            raise RuntimeError(f"Silero VAD needs {vad_model.window_size}-sample frames at {self.samplerate}Hz, "
+                               f"[VAD] frame_ms={self.vad_frame_ms} gives {self.vad_frame_size}.")
+        self.min_silence_duration_ms = cfg.VALUES.silence_duration_ms
+        self._min_silence_samples = int(self.min_silence_duration_ms * self.samplerate / 1000)
+        self._vad_neg_threshold = self.vad_threshold - VAD_NEG_THRESHOLD_OFFSET
+        self._noise_floor = cfg.VALUES.noise_floor # Peak below which idle frames skip the model
         self.min_speech_duration_ms = 100 # Minimum speech chunk to consider valid (tune if needed)
-        self.padding_ms = int(cfg.get_float_setting('Audio', 'trailing_silence_s', allow_zero=True) * 1000) # Trailing padding
-        self.leading_padding_ms = int(cfg.get_float_setting('Audio', 'leading_silence_s', allow_zero=True) * 1000) # Leading padding
+        self.padding_ms = int(cfg.VALUES.trailing_silence_s * 1000) # Trailing padding
+        self.leading_padding_ms = int(cfg.VALUES.leading_silence_s * 1000) # Leading padding
+        self._trailing_pad_samples = int(self.padding_ms * self.samplerate / 1000)
 
         # --- Internal State ---
-        self._buffer = collections.deque()
-        # Adjust buffer size calculation slightly based on frame size for safety
-        self._buffer_frames_count = int((self.leading_padding_ms + self.min_silence_duration_ms + 500) * self.samplerate / 1000)
-        self._max_buffer_items = (self._buffer_frames_count + self.vad_frame_size - 1) // self.vad_frame_size
-
-        self._current_speech_segment_frames = [] # Store numpy frames directly
+        # Lock-free handoff from the PortAudio callback to the VAD worker thread.
+        # The callback only copies samples in; all VAD work happens in _vad_worker.
+        # The ring also keeps the audio just read behind its read position, which is the
+        # leading-padding source (enough for the padding plus one batch of in-flight frames).
+        padding_frames = int(self.leading_padding_ms * self.samplerate / 1000)
+        padding_items = (padding_frames + self.vad_frame_size - 1) // self.vad_frame_size
+        self._leading_pad_samples = padding_items * self.vad_frame_size # Whole frames of leading padding
+        self._audio_ring = SampleRing(self.vad_frame_size * AUDIO_RING_FRAMES,
+                                      history=self._leading_pad_samples + self.vad_frame_size * VAD_MAX_BATCH_FRAMES)
+        self._ring_reserve = self._audio_ring.reserve # Bound once for the callback
+        self._ring_commit = self._audio_ring.commit
+        self._queue_put = transcription_queue.put
+        self._vad_thread = None
+        self._wake_r = self._wake_w = None # Pipe the callback uses to wake the VAD worker
+        self._overruns = 0 # Callbacks dropped because the VAD worker fell behind
+        self._pending_status = None # Last PortAudio status flags, logged by the worker
+
+        # Downmix chosen once here instead of branching per callback. It writes PortAudio's
+        # buffer (float32, valid for the callback's duration) straight into the ring's free
+        # space, so there is no intermediate copy. Multichannel input is averaged rather
+        # than keeping only channel 0.
+        if self.channels == 1:
+            self._downmix_into = lambda indata, out: np.copyto(out, indata[:, 0])
+        else:
+            self._downmix_into = lambda indata, out: np.mean(indata, axis=1, out=out)
+
+        # Speech segments are assembled in place in a shared preallocated arena and queued
+        # as views into it; the transcription worker releases each one when it is done.
+        self._segments = SegmentRing(self.samplerate * SEGMENT_ARENA_SECONDS)
+        self.release_segment = self._segments.release # For the transcription worker
+        self._seg_max = self.samplerate * MAX_SEGMENT_SECONDS
+        self._seg = None # Reserved arena space of the current segment, None if there was no room
+        self._seg_len = 0
         self._is_speaking = False
-        self._silence_start_time = None
+        self._silence_samples = 0 # Consecutive non-speech samples since speech was last heard
 
-        if vad_iterator:
-            vad_iterator.reset_states() # Ensure clean state
+        vad_model.reset_states() # Ensure clean state
 
         # --- Debug: Check Devices ---
         try:
-            logger.debug(f"Available audio devices:\n{sd.query_devices()}")
+            if logger.isEnabledFor(logging.DEBUG): # Skip the PortAudio device scan unless it will be shown
+                logger.debug("Available audio devices:\n%s", sd.query_devices())
             if self.device: sd.check_input_settings(device=self.device, channels=self.channels, samplerate=self.samplerate)
             else: sd.check_input_settings(channels=self.channels, samplerate=self.samplerate)
             logger.info(f"Audio settings check OK (Device: {self.device or 'Default'}, Rate: {self.samplerate}, Channels: {self.channels}, VAD Frame Size: {self.vad_frame_size})")
@@ -84,99 +120,166 @@ class AudioRecorder:
             raise RuntimeError(f"Audio device configuration error: {e}")
 
 
-    def _audio_callback(self, indata, frames, time, status):
-        """Callback for sounddevice InputStream."""
-        if status:
-            logger.warning(f"Audio callback status: {status}")
-
-        if indata.dtype != np.float32:
-            try: indata = indata.astype(np.float32)
-            except Exception as e: logger.error(f"Failed audio dtype conversion: {e}"); return
-
-        if self.channels > 1: mono_data = indata[:, 0].copy()
-        else: mono_data = indata.flatten().copy()
-
-        # Always add to the main buffer for context/padding
-        self._buffer.append(mono_data)
-        while len(self._buffer) > self._max_buffer_items: self._buffer.popleft()
-
-        # --- VAD Processing ---
-        try:
-            if len(mono_data) != self.vad_frame_size:
-                logger.warning(f"Unexpected audio frame size: {len(mono_data)}, expected {self.vad_frame_size}. Skipping VAD.")
+    def _seg_append(self, samples):
+        """Appends samples to the segment buffer, queueing it early if it is full."""
+        if self._seg is None:
+            return # Dropping this utterance: the arena was full when it started
+        n = len(samples)
+        if self._seg_len + n > self._seg_max:
+            logger.info(f"Speech exceeds {MAX_SEGMENT_SECONDS}s, queueing it in pieces.")
+            self._queue_segment()
+            if not self._reserve_segment():
                 return
+        self._seg[self._seg_len:self._seg_len + n] = samples
+        self._seg_len += n
+
+    def _reserve_segment(self):
+        """Reserves arena space for a new segment. Returns False if the worker is too far behind."""
+        self._seg_len = 0
+        self._seg = self._segments.reserve(self._seg_max)
+        if self._seg is None:
+            logger.warning("Transcription backlog full, dropping speech segment.")
+            return False
+        return True
+
+    def _queue_segment(self):
+        """Queues the assembled speech segment for transcription and empties the buffer."""
+        if self._seg is None:
+            return
+        segment_duration_ms = self._seg_len * 1000 / self.samplerate
+        # Check minimum duration? VAD timestamps might already handle this. Let's check anyway.
+        if segment_duration_ms >= self.min_speech_duration_ms:
+            logger.info(f"Queueing speech segment ({segment_duration_ms:.0f}ms).")
+            # Hand off a view into the arena (contiguous float32 at 16 kHz goes straight into
+            # faster-whisper) with the token that releases it; no allocation or copy per segment.
+            token = self._segments.commit(self._seg_len)
+            if not self._queue_put((self._seg[:self._seg_len], token)):
+                self._segments.uncommit()
+                logger.warning("Transcription queue full, dropping speech segment.")
+        else:
+            logger.debug("Discarding short speech segment detected by VAD (%.0fms).", segment_duration_ms)
+        self._seg = None
+        self._seg_len = 0
 
-            audio_chunk_tensor = torch.from_numpy(mono_data).float()
-
-            if vad_iterator is None: logger.error("vad_iterator object is None!"); return
-
-            # --- Call VAD and Check Return Type ---
-            vad_result = vad_iterator(audio_chunk_tensor, return_seconds=True) # Use return_seconds=True for timestamps
-
-            # --- Handle VAD Result (Start/End Timestamps or None) ---
-            if isinstance(vad_result, dict):
-                if 'start' in vad_result:
-                    start_time = vad_result['start']
-                    logger.debug(f"VAD detected speech start at {start_time:.2f}s")
-                    if not self._is_speaking:
-                        self._is_speaking = True
-                        # Add leading padding from buffer *before* the current chunk
-                        self._current_speech_segment_frames = [] # Clear previous segment just in case
-                        if self.leading_padding_ms > 0:
-                            padding_frames = int(self.leading_padding_ms * self.samplerate / 1000)
-                            num_buffer_items_needed = (padding_frames + self.vad_frame_size -1) // self.vad_frame_size
-                            # Grab items from buffer *before* the current frame (index -1)
-                            padding_data_items = list(self._buffer)[max(0, len(self._buffer) - num_buffer_items_needed - 1) : -1]
-                            if padding_data_items:
-                                self._current_speech_segment_frames.extend(padding_data_items) # Use extend
-                                logger.debug(f"Prepended {len(padding_data_items)} frames of leading padding.")
-                    # Append current frame since speech has started
-                    self._current_speech_segment_frames.append(mono_data)
-
-                elif 'end' in vad_result:
-                    end_time = vad_result['end']
-                    logger.debug(f"VAD detected speech end at {end_time:.2f}s")
-                    if self._is_speaking:
-                        self._is_speaking = False
-                        # Current frame might be silence, but add it for trailing padding context maybe? Or not? Let's add it.
-                        self._current_speech_segment_frames.append(mono_data)
-
-                        # --- Finalize and Queue the Segment ---
-                        if not self._current_speech_segment_frames:
-                            logger.debug("No speech frames collected despite end event.")
-                        else:
-                            segment_data_np = np.concatenate(self._current_speech_segment_frames)
-                            segment_duration_ms = len(segment_data_np) * 1000 / self.samplerate
-
-                            # Check minimum duration? VAD timestamps might already handle this. Let's check anyway.
-                            if segment_duration_ms >= self.min_speech_duration_ms:
-                                logger.info(f"Queueing speech segment ({segment_duration_ms:.0f}ms).")
-                                self.transcription_queue.put(segment_data_np)
-                            else:
-                                logger.debug(f"Discarding short speech segment detected by VAD ({segment_duration_ms:.0f}ms).")
-
-                        # Reset for next utterance
-                        self._current_speech_segment_frames = []
-                        if vad_iterator: vad_iterator.reset_states() # Reset VAD internal state after segment
-                    else:
-                         # Got an 'end' without being in 'speaking' state? Log warning.
-                         logger.warning("VAD reported 'end' but wasn't in speaking state.")
-
-                else:
-                    logger.error(f"VAD returned unexpected dict: {vad_result}")
-
-            elif vad_result is None:
-                # Silence within this frame
-                if self._is_speaking:
-                    # Continue accumulating frames if we are in a speech segment
-                    self._current_speech_segment_frames.append(mono_data)
-                # else: Silence continues, do nothing except buffer append (done above)
-
-            else:
-                 logger.error(f"VAD returned unexpected type: {type(vad_result)}")
+    def _audio_callback(self, indata, frames, time, status):
+        """Callback for sounddevice InputStream. Runs on PortAudio's realtime thread.
 
-        except Exception as e:
-            logger.error(f"Error during VAD processing in callback: {e}", exc_info=True)
+        Only copies samples into the SPSC ring and wakes the VAD worker: no VAD
+        inference, logging or locking happens here.
+        """
+        if status:
+            self._pending_status = status
+
+        views = self._ring_reserve(frames)
+        if views is None:
+            self._overruns += 1
+            return
+        start = 0
+        for view in views: # Two views only if the block wraps around the ring's end
+            self._downmix_into(indata[start:start + len(view)], view)
+            start += len(view)
+        self._ring_commit(frames)
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass # Pipe full: the worker already has a wakeup pending
+
+    def _vad_worker(self):
+        """Thread function: pulls frames from the SPSC ring and runs VAD on them."""
+        logger.info("VAD worker thread started.")
+        frame_size = self.vad_frame_size
+        frames = np.empty((VAD_MAX_BATCH_FRAMES, frame_size), dtype=np.float32)
+        # Bound once: these run for every frame
+        ring = self._audio_ring
+        speech_prob = self._speech_prob
+        process_frame = self._process_frame
+        reported_overruns = 0
+        while not self.stop_event.is_set():
+            try:
+                os.read(self._wake_r, 4096) # Blocks until the callback (or stop_recording) writes
+            except OSError as e:
+                logger.error(f"VAD worker wakeup pipe failed: {e}")
+                break
+
+            if self._pending_status is not None:
+                logger.warning(f"Audio callback status: {self._pending_status}")
+                self._pending_status = None
+            if self._overruns != reported_overruns:
+                logger.warning(f"VAD worker fell behind, dropped {self._overruns - reported_overruns} audio blocks.")
+                reported_overruns = self._overruns
+
+            # Drain everything buffered since the last wakeup, up to a batch at a time
+            while not self.stop_event.is_set():
+                count = min(len(ring) // frame_size, VAD_MAX_BATCH_FRAMES)
+                if not count:
+                    break
+                batch = frames[:count]
+                ring.read_into(batch.reshape(-1))
+                for i, frame in enumerate(batch):
+                    try:
+                        prob = speech_prob(frame)
+                    except Exception as e:
+                        logger.error(f"Error during VAD processing: {e}", exc_info=True)
+                        continue
+                    process_frame(frame, prob, (count - i) * frame_size)
+        logger.info("VAD worker thread finished.")
+
+    def _speech_prob(self, frame):
+        """Returns the speech probability of one frame.
+
+        Outside of speech, frames whose peak is under the noise floor are scored 0.0
+        without running the model; during speech every frame is scored so quiet
+        tails are not cut off. Silero's recurrent state carries from one frame to
+        the next, so frames are scored one at a time and in order.
+        """
+        if not self._is_speaking and np.abs(frame).max() < self._noise_floor:
+            return 0.0
+        return vad_model(frame)
+
+    def _process_frame(self, mono_data, speech_prob, ring_offset):
+        """Updates the speech segment state machine with one scored frame.
+
+        `ring_offset` is how far behind the ring's read position this frame starts,
+        i.e. where the audio preceding it (its leading padding) ends.
+        """
+        if speech_prob >= self.vad_threshold:
+            self._silence_samples = 0
+            if not self._is_speaking:
+                logger.debug("VAD detected speech start (p=%.2f)", speech_prob)
+                self._is_speaking = True
+                if not self._reserve_segment():
+                    return # Stays "speaking" so the rest of this utterance is dropped too
+                # Add leading padding straight from the audio ring: the samples *before* the
+                # current frame (which is appended below), as one or two views copied in place
+                if self._leading_pad_samples:
+                    for padding_data in self._audio_ring.history(self._leading_pad_samples, ring_offset):
+                        np.copyto(self._seg[self._seg_len:self._seg_len + len(padding_data)], padding_data)
+                        self._seg_len += len(padding_data)
+                    if self._seg_len:
+                        logger.debug("Prepended %d samples of leading padding.", self._seg_len)
+            # Append current frame since speech has started
+            self._seg_append(mono_data)
+            return
+
+        if not self._is_speaking:
+            return # Silence continues; the ring keeps recent audio for leading padding
+
+        # Continue accumulating frames while in a speech segment; trailing silence is kept as padding
+        self._seg_append(mono_data)
+        if speech_prob >= self._vad_neg_threshold:
+            return # Between the two thresholds: not confidently silence yet
+        self._silence_samples += len(mono_data)
+        if self._silence_samples < self._min_silence_samples:
+            return
+
+        logger.debug("VAD detected speech end after %dms of silence", self.min_silence_duration_ms)
+        self._is_speaking = False
+        # Keep only trailing_silence_s of the silence that ended the segment
+        self._seg_len = max(0, self._seg_len - max(0, self._silence_samples - self._trailing_pad_samples))
+        self._silence_samples = 0
+        # --- Finalize and Queue the Segment ---
+        self._queue_segment()
+        vad_model.reset_states() # Reset VAD internal state after segment
 
     def start_recording(self):
         if self.is_recording_active:
@@ -185,13 +288,21 @@ class AudioRecorder:
 
         logger.info("Starting audio stream for VAD...")
         self.stop_event.clear()
-        if vad_iterator: vad_iterator.reset_states()
-        self._current_speech_segment_frames = []
+        vad_model.reset_states()
+        self._seg = None
+        self._seg_len = 0
         self._is_speaking = False
-        self._silence_start_time = None
-        self._buffer.clear()
+        self._silence_samples = 0
+        self._audio_ring.clear()
+        self._overruns = 0
+        self._pending_status = None
 
         try:
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_w, False) # The audio callback must never block
+            self._vad_thread = threading.Thread(target=self._vad_worker, daemon=True)
+            self._vad_thread.start()
+
             self.stream = sd.InputStream(
                 samplerate=self.samplerate,
                 device=self.device,
@@ -207,14 +318,17 @@ class AudioRecorder:
         except sd.PortAudioError as e:
              logger.error(f"PortAudio error starting stream: {e}", exc_info=True)
              send_notification("Audio Error", f"Failed to start audio stream: {e}", icon_name_cfg_key='error', urgency='critical')
+             self._stop_vad_worker()
              return False
         except ValueError as e:
             logger.error(f"ValueError starting stream: {e}", exc_info=True)
             send_notification("Audio Error", f"Invalid audio setting: {e}", icon_name_cfg_key='error', urgency='critical')
+            self._stop_vad_worker()
             return False
         except Exception as e:
              logger.error(f"Unexpected error starting stream: {e}", exc_info=True)
              send_notification("Audio Error", f"Failed to start stream: {e}", icon_name_cfg_key='error', urgency='critical')
+             self._stop_vad_worker()
              return False
 
     def stop_recording(self):
@@ -224,7 +338,6 @@ class AudioRecorder:
             return False
 
         logger.info("Stopping audio stream...")
-        # No explicit stop_event needed for stream, just stop/close it
         try:
             self.stream.stop()
             self.stream.close()
@@ -238,4 +351,19 @@ class AudioRecorder:
              self.is_recording_active = False
              # Process any potentially remaining data? The callback should handle queueing
              # based on silence detection before the stream actually stops.
-        return True
\ No newline at end of file
+             self._stop_vad_worker()
+        return True
+
+    def _stop_vad_worker(self):
+        """Stops the VAD worker thread and closes its wakeup pipe."""
+        self.stop_event.set()
+        if self._wake_w is not None:
+            try: os.write(self._wake_w, b'\0')
+            except BlockingIOError: pass
+        if self._vad_thread and self._vad_thread.is_alive():
+            self._vad_thread.join(timeout=1.0)
+            if self._vad_thread.is_alive(): logger.warning("VAD worker thread did not exit.")
+        self._vad_thread = None
+        for fd in (self._wake_r, self._wake_w):
+            if fd is not None: os.close(fd)
+        self._wake_r = self._wake_w = None
\ No newline at end of file
@@ -2,19 +2,22 @@
 
 import os
 import sys
+import stat
+import pwd
+import grp
+import time
 import subprocess
 import json
 import argparse
+import hashlib
+import sqlite3
+import functools
+import asyncio
 import tempfile
 import shlex
 import re
 import logging # Import logging
-from pathlib import Path
-from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError
-from rich.console import Console
-from rich.text import Text
-from rich.prompt import Confirm, Prompt
+from collections import deque
 
 # --- Basic Logging Setup ---
 # Configure logging format and default level to WARNING
@@ -23,7 +26,11 @@ logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s -
 log = logging.getLogger()
 
 # --- Configuration ---
-load_dotenv() # Load variables from .env file
+# openai, rich and dotenv are imported where they're first needed, so -h and
+# argument errors don't pay for loading them.
+if 'OPENAI_API_KEY' not in os.environ: # Already configured by the environment: skip reading .env
+    from dotenv import load_dotenv
+    load_dotenv() # Load variables from .env file
 
 APP_NAME = 'commander'
 
@@ -39,122 +46,198 @@ USER_PROMPT_TEMPLATE = "Context:\n{context}\n\nUser Query:\n{query}\n\nGenerate
 
 # --- Context Configuration ---
 HISTORY_LINES = 15
+LS_MAX_ENTRIES = int(os.getenv("COMMANDER_LS_MAX_ENTRIES", 50)) # Directory entries sent as context
 HISTORY_FILTER_PATTERN = r'^\s*(export|history|source .*/commander\.py|.*/commander\.py)\s+'
 
+# Compiled once, on first use, rather than looked up in re's cache on every history line / response.
+# Paths that never reach them (-h, argument errors) don't compile anything.
+@functools.cache
+def _history_filter_re():
+    return re.compile(HISTORY_FILTER_PATTERN)
+
+def _is_history_timestamp(line):
+    """True for bash HISTTIMEFORMAT lines like '#1700000000'."""
+    line = line.strip()
+    return line[:1] == '#' and line[1:].isdigit()
+
+def _strip_zsh_prefix(line):
+    """Removes zsh's extended-history ': <start>:<elapsed>;' prefix, if present."""
+    if line.startswith(': '):
+        head, sep, rest = line.partition(';')
+        start, colon, elapsed = head[2:].partition(':')
+        if sep and colon and start.isdigit() and elapsed.isdigit():
+            return rest
+    return line
+
+@functools.cache
+def _safe_start_re():
+    return re.compile(r'^[a-zA-Z0-9_./~-]')
+
 # --- Other Config ---
 EDITOR = os.getenv("EDITOR", "nano")
+BATCH_CONCURRENCY = 4 # Default simultaneous API requests in --batch mode
+
+# --- Response Cache ---
+# Suggestions are cached by (model, prompt, context, query), so repeating a query in an
+# unchanged directory skips the API round-trip. COMMANDER_CACHE_TTL=0 disables it.
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), APP_NAME)
+RESPONSE_CACHE_FILE = os.path.join(CACHE_DIR, 'responses.sqlite')
+RESPONSE_CACHE_TTL = int(os.getenv("COMMANDER_CACHE_TTL", 7 * 24 * 3600)) # Seconds
 
-# --- Initialize Rich Console ---
-console = Console()
+# --- Rich Console (created on first use) ---
+@functools.cache
+def get_console():
+    from rich.console import Console
+    return Console()
+
+def get_prompt():
+    from rich.prompt import Prompt
+    return Prompt
 
 # --- Functions ---
 
-def check_dependencies():
-    pass
+def _response_cache_key(context_dict, query, model):
+    """Hashes everything that determines the model's answer."""
+    key_data = json.dumps({'m': model, 'sp': SYSTEM_PROMPT, 'c': context_dict, 'q': query}, sort_keys=True)
+    return hashlib.blake2b(key_data.encode(), digest_size=16).hexdigest()
+
+def _open_response_cache():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    db = sqlite3.connect(RESPONSE_CACHE_FILE)
+    db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, command TEXT NOT NULL, created REAL NOT NULL)")
+    return db
 
-def run_subprocess(cmd_list, capture=True, check=False, text=True, timeout=10):
-    """Helper to run subprocesses and handle errors."""
-    log.debug(f"Running subprocess: {' '.join(map(shlex.quote, cmd_list))}")
+def cache_lookup(key):
+    """Returns the cached command for `key` if it is younger than the TTL, else None."""
     try:
-        # --- CORRECTED LINE ---
-        # Ensure NO explicit stderr or stdout when capture_output=True
-        result = subprocess.run(
-            cmd_list,
-            capture_output=capture, # This sets stdout=PIPE, stderr=PIPE internally
-            check=check,
-            text=text,
-            timeout=timeout
-            # NO stderr=subprocess.PIPE HERE
-        )
-        # --- END CORRECTION ---
-
-        # Handling based on 'check' flag
-        if check and result.returncode != 0:
-             # This condition is technically redundant if check=True raises CalledProcessError,
-             # but acts as a safeguard or if check=False is used differently later.
-             log.error(f"Command failed (exit code {result.returncode}): {' '.join(cmd_list)}\nStderr: {result.stderr}")
-             return f"Error running {' '.join(cmd_list)}"
-
-        # Return based on 'capture' flag
-        if capture:
-             log.debug(f"Subprocess exited with {result.returncode}. Stdout captured.")
-             # Check stderr even on success if capturing, could contain warnings
-             if result.stderr:
-                 log.debug(f"Subprocess stderr: {result.stderr.strip()}")
-             return result.stdout.strip()
-        else:
-             log.debug(f"Subprocess exited with {result.returncode}.")
-             return result.returncode # Return exit code if not capturing stdout
+        db = _open_response_cache()
+        try:
+            row = db.execute("SELECT command FROM responses WHERE key = ? AND created > ?",
+                             (key, time.time() - RESPONSE_CACHE_TTL)).fetchone()
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        log.warning(f"Could not read response cache {RESPONSE_CACHE_FILE}: {e}")
+        return None
+    return row[0] if row else None
 
+def cache_store(key, command):
+    """Stores a suggested command and drops expired entries."""
+    try:
+        db = _open_response_cache()
+        try:
+            with db: # Commits the transaction
+                db.execute("INSERT OR REPLACE INTO responses (key, command, created) VALUES (?, ?, ?)", (key, command, time.time()))
+                db.execute("DELETE FROM responses WHERE created <= ?", (time.time() - RESPONSE_CACHE_TTL,))
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        log.warning(f"Could not write response cache {RESPONSE_CACHE_FILE}: {e}")
+
+def _ls_al(path='.', max_entries=None):
+    """Returns a listing of `path` formatted like `ls -al`, built from os.scandir instead of spawning ls.
+
+    With `max_entries`, only that many entries are listed (and stat'ed), followed by a
+    count of the rest, so a huge directory can't flood the prompt.
+    """
+    users, groups = {}, {}
+    def user_name(uid):
+        if uid not in users:
+            try: users[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError: users[uid] = str(uid)
+        return users[uid]
+    def group_name(gid):
+        if gid not in groups:
+            try: groups[gid] = grp.getgrgid(gid).gr_name
+            except KeyError: groups[gid] = str(gid)
+        return groups[gid]
+
+    try:
+        entries = [('.', os.lstat(path)), ('..', os.lstat(os.path.join(path, '..')))]
+        with os.scandir(path) as it:
+            dir_entries = sorted(it, key=lambda e: e.name)
+        omitted = 0
+        if max_entries is not None and len(dir_entries) > max_entries:
+            omitted = len(dir_entries) - max_entries
+            dir_entries = dir_entries[:max_entries]
+        for entry in dir_entries:
+            try:
+                entries.append((entry.name, entry.stat(follow_symlinks=False)))
+            except OSError:
+                continue # Vanished while listing
+    except OSError as e:
+        log.error(f"Could not list {path}: {e}")
+        return f"Error listing {path}"
+
+    six_months_ago = time.time() - 182 * 24 * 3600
+    rows = []
+    for name, st in entries:
+        date_format = '%b %e %H:%M' if st.st_mtime > six_months_ago else '%b %e  %Y' # Same cutoff as ls
+        if stat.S_ISLNK(st.st_mode):
+            try: name = f"{name} -> {os.readlink(os.path.join(path, name))}"
+            except OSError: pass
+        rows.append((stat.filemode(st.st_mode), str(st.st_nlink), user_name(st.st_uid), group_name(st.st_gid),
+                     str(st.st_size), time.strftime(date_format, time.localtime(st.st_mtime)), name))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(5)]
+    lines = [] if omitted else [f"total {sum(st.st_blocks for _, st in entries) // 2}"] # st_blocks counts 512-byte units, ls shows 1K
+    for mode, nlink, user, group, size, date, name in rows:
+        lines.append(f"{mode} {nlink:>{widths[1]}} {user:<{widths[2]}} {group:<{widths[3]}} {size:>{widths[4]}} {date} {name}")
+    if omitted:
+        lines.append(f"... ({omitted} more entries)")
+    return "\n".join(lines)
+
+def collect_history():
+    """Returns recent shell history lines from $HISTFILE (default ~/.bash_history), minus filtered commands.
+
+    Reads the file directly: a `history` builtin run through a non-interactive
+    subshell has no history to show.
+    """
+    history_path = os.path.expanduser(os.environ.get('HISTFILE') or '~/.bash_history')
+    log.debug("Reading history from %s", history_path)
+    filter_re = _history_filter_re()
+    try:
+        with open(history_path, 'r', errors='replace') as f:
+            # Only the tail is needed; timestamp lines (HISTTIMEFORMAT) don't count towards it
+            history_raw = deque((line for line in f if not _is_history_timestamp(line)), maxlen=HISTORY_LINES)
     except FileNotFoundError:
-        log.error(f"Command not found: {cmd_list[0]}")
-        console.print(f"[bold red]Error:[/bold red] Command not found: {cmd_list[0]}")
-        return f"Error running {cmd_list[0]}"
-    except subprocess.TimeoutExpired:
-        log.error(f"Command timed out: {' '.join(cmd_list)}")
-        console.print(f"[bold red]Error:[/bold red] Command timed out: {' '.join(cmd_list)}")
-        return f"Error: Timeout running {' '.join(cmd_list)}"
-    except subprocess.CalledProcessError as e: # Happens when check=True and exit code != 0
-        log.error(f"Command failed: {' '.join(cmd_list)}\nStderr: {e.stderr}")
-        # Don't necessarily print to console here, let caller decide? Or keep it.
-        # console.print(f"[bold red]Error:[/bold red] Command failed: {' '.join(cmd_list)}\n{e.stderr}")
-        return f"Error running {' '.join(cmd_list)}"
-    except ValueError as e: # Catch the specific argument error
-         log.exception(f"ValueError running subprocess {' '.join(cmd_list)} (check arguments like capture_output/stdout/stderr)")
-         console.print(f"[bold red]Internal Error:[/bold red] Subprocess configuration error for {' '.join(cmd_list)}: {e}")
-         return f"Error configuring subprocess for {' '.join(cmd_list)}"
-    except Exception as e:
-        log.exception(f"Unexpected error running {' '.join(cmd_list)}")
-        console.print(f"[bold red]Error:[/bold red] Unexpected error running {' '.join(cmd_list)}: {e}")
-        return f"Error running {' '.join(cmd_list)}"
+        log.warning(f"No shell history file at {history_path}.")
+        return []
+    except OSError as e:
+        log.warning(f"Could not read shell history from {history_path}: {e}")
+        return []
+
+    filtered_lines = []
+    for line in history_raw:
+        line_content = _strip_zsh_prefix(line).strip() # Plain string ops: no regex per line
+        if line_content and not filter_re.match(line_content):
+            filtered_lines.append(line_content)
+        else:
+             log.debug("Filtered out history line: %s", line.rstrip('\n'))
+    log.debug("Filtered history lines: %s", filtered_lines)
+    return filtered_lines
 
 def collect_context():
-    """Collects shell context (pwd, ls, uname, whoami, filtered history)."""
+    """Collects shell context (pwd, ls, uname, whoami, filtered history).
+
+    Everything comes from Python's own syscall wrappers rather than forked
+    ls/uname/whoami/shell processes.
+    """
     context = {}
     log.debug("Starting context collection.")
-    console.print("Collecting context...", style="dim")
+    get_console().print("Collecting context...", style="dim")
     context['pwd'] = os.getcwd()
-    log.debug(f"pwd: {context['pwd']}")
-    context['ls -al'] = run_subprocess(['ls', '-al'])
-    log.debug(f"ls -al: {context['ls -al'][:200]}...")
-    context['uname -a'] = run_subprocess(['uname', '-a'])
-    log.debug(f"uname -a: {context['uname -a']}")
-    context['whoami'] = run_subprocess(['whoami'])
-    log.debug(f"whoami: {context['whoami']}")
-
-    # --- History Collection ---
-    potential_history = []
-    try:
-        history_cmd_str = f"history {HISTORY_LINES}"
-        log.debug(f"Attempting history collection with command string: '{history_cmd_str}'")
-        history_raw = subprocess.run(
-            history_cmd_str, shell=True, capture_output=True, text=True,
-            timeout=5, check=True
-        ).stdout.strip()
-
-        log.debug(f"Raw history output (first 200 chars): {history_raw[:200]}...")
-        filtered_lines = []
-        for line in history_raw.splitlines():
-            line_content = re.sub(r'^\s*\d+\s+', '', line).strip()
-            if line_content and not re.match(HISTORY_FILTER_PATTERN, line_content):
-                filtered_lines.append(line_content)
-            else:
-                 log.debug(f"Filtered out history line: {line}")
-        potential_history = filtered_lines
-        log.debug(f"Filtered history lines: {potential_history}")
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
-        log.warning(f"Could not get shell history via '{history_cmd_str}' command: {e}")
-        potential_history = []
-    except FileNotFoundError:
-         log.warning("The 'history' command seems unavailable in this environment.")
-         potential_history = []
-    except Exception as e:
-        log.exception("Unexpected error during history collection.")
-        console.print(f"[yellow]Warning:[/yellow] Could not reliably get shell history: {e}")
-        potential_history = []
-
+    log.debug("pwd: %s", context['pwd'])
+    context['ls -al'] = _ls_al(context['pwd'], max_entries=LS_MAX_ENTRIES)
+    log.debug("ls -al: %.200s...", context['ls -al'])
+    context['uname -a'] = ' '.join(os.uname())
+    log.debug("uname -a: %s", context['uname -a'])
+    context['whoami'] = pwd.getpwuid(os.geteuid()).pw_name
+    log.debug("whoami: %s", context['whoami'])
+
+    potential_history = collect_history()
     context['potential_history'] = potential_history
-    console.print(f"Context collected ({len(potential_history)} potential history lines).", style="dim")
+    get_console().print(f"Context collected ({len(potential_history)} potential history lines).", style="dim")
     log.debug("Finished context collection.")
     return context
 
@@ -163,21 +246,25 @@ def prompt_for_history_selection(potential_history):
     """Interactively prompts the user to select history lines."""
     if not potential_history:
         log.debug("No potential history to prompt for.")
-        console.print("No relevant history found to include.", style="dim")
+        get_console().print("No relevant history found to include.", style="dim")
         return []
 
-    console.print("--- Recent (filtered) History ---", style="bold blue")
+    # One print of one Text: no per-line markup parsing or highlighting, and history
+    # lines containing [brackets] are shown verbatim
+    from rich.text import Text
+    listing = Text("--- Recent (filtered) History ---\n", style="bold blue")
     for i, line in enumerate(potential_history):
-        console.print(f"{i+1: >2}: {line}")
-    console.print("---", style="bold blue")
+        listing.append(f"{i+1: >2}: {line}\n")
+    listing.append("---", style="bold blue")
+    get_console().print(listing, highlight=False)
 
     lines_to_include = []
     while True:
-        selection = Prompt.ask(
+        selection = get_prompt().ask(
             "Include history lines (e.g., 1,3,5), 'a' for all, 'n' for none",
             default="n"
         ).strip().lower()
-        log.debug(f"User history selection input: '{selection}'")
+        log.debug("User history selection input: '%s'", selection)
 
         if selection == 'a':
             lines_to_include = potential_history
@@ -192,39 +279,88 @@ def prompt_for_history_selection(potential_history):
                 invalid_indices = [i+1 for i in indices if not (0 <= i < len(potential_history))]
                 if invalid_indices:
                      log.warning(f"Ignoring invalid history indices: {invalid_indices}")
-                     console.print(f"[yellow]Warning:[/yellow] Ignoring invalid numbers: {invalid_indices}")
+                     get_console().print(f"[yellow]Warning:[/yellow] Ignoring invalid numbers: {invalid_indices}")
 
                 lines_to_include = [potential_history[i] for i in valid_indices]
                 lines_to_include = list(dict.fromkeys(lines_to_include))
-                log.debug(f"Selected history indices: {valid_indices}")
+                log.debug("Selected history indices: %s", valid_indices)
                 break
             except ValueError:
                 log.warning("Invalid input format for history selection.")
-                console.print("[bold red]Invalid input.[/bold red] Please enter numbers separated by commas, 'a', or 'n'.")
+                get_console().print("[bold red]Invalid input.[/bold red] Please enter numbers separated by commas, 'a', or 'n'.")
         # Loop continues if input was invalid
 
     # Use log.info for significant actions, log.debug for finer detail
     log.info(f"Selected {len(lines_to_include)} history lines for context.")
     if lines_to_include:
-         console.print(f"Including {len(lines_to_include)} history line(s) in context.", style="dim")
+         get_console().print(f"Including {len(lines_to_include)} history line(s) in context.", style="dim")
     else:
-         console.print("Including no history in context.", style="dim")
+         get_console().print("Including no history in context.", style="dim")
     return lines_to_include
 
 
-def get_command_from_openai(context_dict, query, model):
-    """Sends context and query to OpenAI, returns the suggested command."""
+def format_context(context_dict):
+    """Renders the context as plain `key: value` lines for the prompt.
+
+    Cheaper in tokens than indented JSON, which adds quoting, escaped newlines and
+    indentation the model doesn't need. Multi-line values and lists go on their own lines.
+    """
+    lines = []
+    for key, value in context_dict.items():
+        if isinstance(value, (list, tuple)):
+            value = '\n'.join(map(str, value))
+        value = str(value)
+        lines.append(f"{key}:\n{value}" if '\n' in value else f"{key}: {value}")
+    return '\n'.join(lines)
+
+@functools.lru_cache(maxsize=1)
+def get_client():
+    """Returns the shared AsyncOpenAI client, so its HTTP connection pool (and TLS sessions) are reused across queries."""
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    import httpx
+    return AsyncOpenAI(api_key=OPENAI_API_KEY,
+                       http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(max_keepalive_connections=20)))
+
+async def close_client():
+    """Closes the shared client if one was created. Call before the event loop ends."""
+    if get_client.cache_info().currsize:
+        await get_client().close()
+        get_client.cache_clear()
+
+def _command_lines(lines):
+    """Returns the non-empty lines of a response that aren't markdown code fences."""
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('```')]
+
+async def get_command_from_openai(context_dict, query, model, use_cache=True):
+    """Sends context and query to OpenAI, returns the suggested command.
+
+    Async so the request doesn't hold a thread for the API round-trip and
+    several queries can be issued concurrently when used as a library.
+    Answers are served from / saved to the response cache unless `use_cache` is False.
+    """
+    cache_key = None
+    if use_cache and RESPONSE_CACHE_TTL > 0:
+        cache_key = _response_cache_key(context_dict, query, model)
+        cached = cache_lookup(cache_key)
+        if cached:
+            log.info(f"Using cached suggestion for this query and context: '{cached}'")
+            get_console().print("Using cached suggestion (--no-cache to ask again).", style="dim")
+            return cached
+
+    from openai import OpenAIError
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        log.debug("OpenAI client initialized.")
+        client = get_client()
+        log.debug("OpenAI client ready.")
     except Exception as e:
          log.exception("Failed to initialize OpenAI client")
-         console.print(f"[bold red]Error:[/bold red] Failed to initialize OpenAI client: {e}")
+         get_console().print(f"[bold red]Error:[/bold red] Failed to initialize OpenAI client: {e}")
          return None
 
-    context_string = json.dumps(context_dict, indent=2)
+    context_string = format_context(context_dict)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"Context sent to the API:\n{json.dumps(context_dict, indent=2)}")
     user_prompt_content = USER_PROMPT_TEMPLATE.format(context=context_string, query=query)
-    log.debug(f"Using model: {model}")
+    log.debug("Using model: %s", model)
 
     payload = {
         "model": model,
@@ -235,44 +371,61 @@ def get_command_from_openai(context_dict, query, model):
         "temperature": 0.2,
         "max_tokens": 200
     }
-    log.debug(f"OpenAI request payload (excluding content): {{'model': '{model}', 'temperature': 0.2, 'max_tokens': 200}}")
+    log.debug("OpenAI request payload (excluding content): %r",
+              {key: value for key, value in payload.items() if key != 'messages'})
 
-    console.print(f"Asking AI (Model: {model})...", style="dim")
+    get_console().print(f"Asking AI (Model: {model})...", style="dim")
     try:
-        response = client.chat.completions.create(**payload)
-        log.debug(f"Raw OpenAI response object: {response}")
+        # Streamed: the answer is a single command line, so stop reading as soon as that
+        # line is complete instead of waiting for (and paying for) the rest of the completion
+        stream = await client.chat.completions.create(**payload, stream=True)
+        parts = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    command_lines = _command_lines(''.join(parts).split('\n')[:-1]) # Complete lines only
+                    if command_lines and not command_lines[-1].endswith('\\'): # No line continuation pending
+                        log.debug("Command line complete, closing the stream early.")
+                        break
+        finally:
+            await stream.close()
 
-        # Log HTTP request/response details if needed (can be verbose)
-        # Requires inspecting headers/status from the underlying http client if using openai lib v1+
-        # For now, just log success based on reaching this point without error
         log.info(f"OpenAI API call successful (Model: {model})") # Log success at INFO level
-
-        command = response.choices[0].message.content
+        response_text = ''.join(parts)
+        log.debug("Raw OpenAI response text: %r", response_text)
+        command_lines = _command_lines(response_text.split('\n'))
+        # Keep only the first complete command (continuation lines included), dropping anything
+        # received after it, such as the start of a second line
+        first_end = next((i for i, line in enumerate(command_lines) if not line.endswith('\\')), len(command_lines) - 1)
+        command = '\n'.join(command_lines[:first_end + 1])
         if not command:
              log.error("AI returned an empty response content.")
-             console.print("[bold red]Error:[/bold red] AI returned an empty response.")
+             get_console().print("[bold red]Error:[/bold red] AI returned an empty response.")
              return None
 
-        original_command = command
+        original_command = response_text
         command = command.strip().strip('`').strip()
         # Log suggested commands at INFO level
         log.info(f"AI suggested command (raw): '{original_command}'")
         log.info(f"AI suggested command (cleaned): '{command}'")
 
 
-        if command and not re.match(r'^[a-zA-Z0-9_./~-]', command):
+        if command and not _safe_start_re().match(command):
             log.warning(f"AI command starts with potentially unsafe characters: '{command[:20]}...'")
-            console.print(f"[yellow]Warning:[/yellow] AI returned potentially unsafe command start: '{command[:20]}...'")
+            get_console().print(f"[yellow]Warning:[/yellow] AI returned potentially unsafe command start: '{command[:20]}...'")
 
+        if cache_key:
+            cache_store(cache_key, command)
         return command
 
     except OpenAIError as e:
         log.exception("OpenAI API Error occurred")
-        console.print(f"[bold red]Error:[/bold red] OpenAI API Error: {e}")
+        get_console().print(f"[bold red]Error:[/bold red] OpenAI API Error: {e}")
         return None
     except Exception as e:
         log.exception("Failed to get response from OpenAI")
-        console.print(f"[bold red]Error:[/bold red] Failed to get response from OpenAI: {e}")
+        get_console().print(f"[bold red]Error:[/bold red] Failed to get response from OpenAI: {e}")
         return None
 
 
@@ -283,10 +436,10 @@ def edit_command_in_editor(command):
         with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix=".sh") as tf:
             tf.write(command + '\n')
             temp_file_path = tf.name
-        log.debug(f"Opening editor '{EDITOR}' for temporary file: {temp_file_path}")
+        log.debug("Opening editor '%s' for temporary file: %s", EDITOR, temp_file_path)
 
-        editor_cmd = shlex.split(EDITOR)
-        status = run_subprocess(editor_cmd + [temp_file_path], capture=False)
+        # Interactive: inherits the terminal directly
+        status = subprocess.call(shlex.split(EDITOR) + [temp_file_path])
 
         if status == 0:
             with open(temp_file_path, 'r') as tf:
@@ -295,17 +448,20 @@ def edit_command_in_editor(command):
             return edited_command
         else:
             log.warning(f"Editor exited with non-zero status {status}. Assuming no changes.")
-            console.print(f"[yellow]Warning:[/yellow] Editor exited with status {status}. Using original command.")
+            get_console().print(f"[yellow]Warning:[/yellow] Editor exited with status {status}. Using original command.")
             return command
 
     except Exception as e:
         log.exception("Failed to open or process editor")
-        console.print(f"[bold red]Error:[/bold red] Failed to open editor: {e}")
+        get_console().print(f"[bold red]Error:[/bold red] Failed to open editor: {e}")
         return command
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            log.debug(f"Deleting temporary file: {temp_file_path}")
-            os.unlink(temp_file_path)
+        if temp_file_path:
+            log.debug("Deleting temporary file: %s", temp_file_path)
+            try:
+                os.unlink(temp_file_path)
+            except FileNotFoundError:
+                pass
 
 
 def run_command_with_confirmation(command_to_run, query):
@@ -314,42 +470,37 @@ def run_command_with_confirmation(command_to_run, query):
     is_interactive_term = sys.stdin.isatty() and sys.stdout.isatty()
 
     while True:
-        log.debug(f"Presenting command for confirmation: '{current_command}'")
-        console.print("--- Suggested Command ---", style="bold cyan")
-        console.print(current_command, style="bold")
-        console.print("---", style="bold cyan")
+        log.debug("Presenting command for confirmation: '%s'", current_command)
+        get_console().print("--- Suggested Command ---", style="bold cyan")
+        get_console().print(current_command, style="bold")
+        get_console().print("---", style="bold cyan")
 
         if not is_interactive_term:
              log.warning("Not interactive terminal, skipping execution confirmation.")
-             console.print("[yellow]Warning:[/yellow] Not an interactive terminal. Cannot ask for execution confirmation.")
-             console.print("Printing command only.")
+             get_console().print("[yellow]Warning:[/yellow] Not an interactive terminal. Cannot ask for execution confirmation.")
+             get_console().print("Printing command only.")
              break
 
         try:
-             action = Prompt.ask(
+             action = get_prompt().ask(
                  "[bold yellow]Execute this command?[/bold yellow]",
                  choices=["y", "n", "e"],
                  default="n"
              ).lower()
-             log.debug(f"User confirmation action: '{action}'")
+             log.debug("User confirmation action: '%s'", action)
         except EOFError:
              action = "n"
              log.info("User aborted confirmation via EOF.")
-             console.print("\nAborted.")
+             get_console().print("\nAborted.")
 
 
         if action == "y":
             log.info(f"User confirmed execution for command: '{current_command}'")
-            console.print("Executing...", style="dim")
-
-            exit_code = run_subprocess(
-                [current_command],
-                capture=False,
-                check=False,
-                shell=True
-            )
+            get_console().print("Executing...", style="dim")
+
+            exit_code = subprocess.call(current_command, shell=True) # Runs in the user's terminal
             log.info(f"Command execution finished with exit code: {exit_code}")
-            console.print(f"--- Command finished (Exit Code: {exit_code}) ---", style="dim")
+            get_console().print(f"--- Command finished (Exit Code: {exit_code}) ---", style="dim")
             sys.exit(exit_code)
 
         elif action == "e":
@@ -360,18 +511,48 @@ def run_command_with_confirmation(command_to_run, query):
                 log.debug("Command was edited, looping for confirmation.")
             elif edited == current_command:
                  log.info("Edit resulted in no changes to the command.")
-                 console.print("No changes detected.", style="dim")
+                 get_console().print("No changes detected.", style="dim")
             else:
                  log.warning("Edit process cancelled or failed.")
-                 console.print("Edit cancelled or failed. Aborting execution.", style="dim")
+                 get_console().print("Edit cancelled or failed. Aborting execution.", style="dim")
                  sys.exit(1)
         else: # n or any other input
              log.info("User aborted execution.")
-             console.print("Execution aborted by user.", style="dim")
+             get_console().print("Execution aborted by user.", style="dim")
              sys.exit(0)
 
 
-def main():
+async def run_batch(queries, model, use_cache=True, concurrency=BATCH_CONCURRENCY):
+    """Answers many queries in one process: context is collected once, the API client and
+    its connections are shared, and up to `concurrency` requests are in flight at a time.
+
+    Prints each query with its suggested command and returns an exit status.
+    """
+    queries = [query.strip() for query in queries if query.strip()]
+    if not queries:
+        get_console().print("[bold red]Error:[/bold red] No queries on stdin.")
+        return 1
+
+    context = await asyncio.to_thread(collect_context)
+    del context['potential_history'] # No one to ask which lines to include
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(query):
+        async with semaphore:
+            return await get_command_from_openai(context, query, model, use_cache=use_cache)
+
+    try:
+        results = await asyncio.gather(*(bounded(query) for query in queries))
+    finally:
+        await close_client()
+
+    for query, command in zip(queries, results):
+        get_console().print(f"# {query}", style="dim")
+        get_console().print(command if command else "# (no command)", style="bold" if command else "red")
+    return 0 if all(results) else 1
+
+
+async def main():
     """Main function."""
     parser = argparse.ArgumentParser(
         description="Translates natural language queries into Linux shell commands using OpenAI.",
@@ -388,6 +569,27 @@ def main():
         default=OPENAI_MODEL,
         help=f'Specify the OpenAI model to use (default: {OPENAI_MODEL}).'
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always ask the API instead of reusing a cached suggestion.'
+    )
+    parser.add_argument(
+        '--no-history-prompt',
+        action='store_true',
+        help="Don't offer shell history lines to include in the context."
+    )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='Read one query per line from stdin and answer them concurrently (print only).'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=BATCH_CONCURRENCY,
+        help=f'Maximum simultaneous API requests in --batch mode (default: {BATCH_CONCURRENCY}).'
+    )
     parser.add_argument(
         '-d', '--debug',
         action='store_true',
@@ -408,13 +610,20 @@ def main():
     # else:
     #    log.setLevel(logging.INFO) # REMOVED THIS LINE
 
-    log.debug(f"Parsed arguments: {args}")
+    log.debug("Parsed arguments: %s", args)
 
     if not OPENAI_API_KEY:
         log.critical("OPENAI_API_KEY environment variable not set.")
-        console.print("[bold red]Error:[/bold red] OPENAI_API_KEY environment variable not set.")
+        get_console().print("[bold red]Error:[/bold red] OPENAI_API_KEY environment variable not set.")
         sys.exit(1)
 
+    if args.batch:
+        if args.execute:
+            parser.error("--batch cannot be combined with --execute.")
+        if sys.stdin.isatty():
+            parser.error("--batch reads queries from stdin, one per line.")
+        sys.exit(await run_batch(sys.stdin.read().splitlines(), args.model, not args.no_cache, args.concurrency))
+
     user_query = ""
     if args.query:
         user_query = " ".join(args.query)
@@ -425,22 +634,24 @@ def main():
     else:
         parser.print_help()
         log.error("No query provided via arguments or stdin in interactive mode.")
-        console.print("\n[bold red]Error:[/bold red] No query provided via arguments or stdin.")
+        get_console().print("\n[bold red]Error:[/bold red] No query provided via arguments or stdin.")
         sys.exit(1)
 
     if not user_query:
         log.error("Query is empty.")
-        console.print("[bold red]Error:[/bold red] Query cannot be empty.")
+        get_console().print("[bold red]Error:[/bold red] Query cannot be empty.")
         sys.exit(1)
 
     # Use INFO for the main processing step
     log.info(f"Processing query: \"{user_query}\"")
-    console.print(f"Query: \"{user_query}\"")
+    get_console().print(f"Query: \"{user_query}\"")
 
-    context = collect_context()
+    context = await asyncio.to_thread(collect_context) # scandir/lstat and the history read still block, so they stay off the event loop
     selected_history = []
 
-    if sys.stdin.isatty() and sys.stdout.isatty():
+    if args.no_history_prompt:
+        log.debug("History prompt disabled by --no-history-prompt.")
+    elif sys.stdin.isatty() and sys.stdout.isatty():
         log.debug("Running interactively, prompting for history selection.")
         selected_history = prompt_for_history_selection(context.get('potential_history', []))
     else:
@@ -450,11 +661,14 @@ def main():
     del final_context_for_api['potential_history']
     if selected_history:
         final_context_for_api['selected_history'] = selected_history
-        log.debug(f"Final context includes {len(selected_history)} selected history lines.")
+        log.debug("Final context includes %d selected history lines.", len(selected_history))
     else:
          log.debug("Final context includes no history.")
 
-    suggested_command = get_command_from_openai(final_context_for_api, user_query, args.model)
+    try:
+        suggested_command = await get_command_from_openai(final_context_for_api, user_query, args.model, use_cache=not args.no_cache)
+    finally:
+        await close_client() # The CLI makes one request; close the pool while the loop is still running
 
     if not suggested_command:
         sys.exit(1)
@@ -464,21 +678,21 @@ def main():
         run_command_with_confirmation(suggested_command, user_query)
     else:
         log.debug("Execute flag not set, printing command only.")
-        console.print("--- Suggested Command ---", style="bold cyan")
-        console.print(suggested_command, style="bold")
-        console.print("---", style="bold cyan")
-        console.print("Run with -x or --execute to enable execution.", style="dim")
+        get_console().print("--- Suggested Command ---", style="bold cyan")
+        get_console().print(suggested_command, style="bold")
+        get_console().print("---", style="bold cyan")
+        get_console().print("Run with -x or --execute to enable execution.", style="dim")
         sys.exit(0)
 
 
 if __name__ == "__main__":
     try:
-        main()
+        asyncio.run(main())
     except KeyboardInterrupt:
          log.info("Operation cancelled by user (KeyboardInterrupt).")
-         console.print("\nOperation cancelled by user.", style="yellow")
+         get_console().print("\nOperation cancelled by user.", style="yellow")
          sys.exit(1)
     except Exception as e:
          log.exception("An unhandled error occurred in main.")
-         console.print(f"\n[bold red]An unexpected error occurred:[/bold red] {e}")
+         get_console().print(f"\n[bold red]An unexpected error occurred:[/bold red] {e}")
          sys.exit(1)
\ No newline at end of file
@@ -1,12 +1,20 @@
-import configparser
+import dataclasses
 import os
 import sys
 import logging
 import re # Import regex module for parsing commands
+import shlex
+try:
+    import re._parser as _re_parser # Python 3.11+
+except ImportError:
+    import sre_parse as _re_parser
+from types import MappingProxyType
+import fast_ini
 
 APP_NAME = 'asr-indicator' # Consistent App Name
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".config", APP_NAME)
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.ini")
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser("~"), ".cache"), APP_NAME)
 
 # Define defaults directly here for clarity
 DEFAULT_CONFIG = {
@@ -16,8 +24,12 @@ DEFAULT_CONFIG = {
     'Whisper': {
         'model_size': 'medium.en',
         'device': 'cpu',
-        'compute_type': 'int8',
+        'compute_type': 'int8', # int8 / int8_float16 / int8_bfloat16 / float16 / float32. 'auto' picks int8 on CPU, int8_float16 on CUDA
+        'cpu_threads': '0',     # 0 uses half the CPU cores
         'beam_size': '5',
+        'greedy': 'true',      # Greedy decoding for short VAD-cut utterances; set false to use beam_size
+        'language': '',        # e.g. 'en'. Empty lets Whisper detect the language
+        'decode_in_process': 'true', # Read audio files with soundfile (+ soxr to resample) instead of spawning ffmpeg
     },
     'Audio': {
         'input_device': 'default',
@@ -30,6 +42,9 @@ DEFAULT_CONFIG = {
         'speech_threshold': '0.5',
         'silence_duration_ms': '700',
         'frame_ms': '32',
+        'noise_floor': '0.003', # Peak amplitude (0.0-1.0) below which idle frames skip the VAD model. 0 disables
+        'model_path': '',    # Silero VAD v5/v6 ONNX file (e.g. an int8 export). Empty uses silero-vad's bundled model or downloads it
+        'providers': 'CPUExecutionProvider', # Comma-separated ONNX Runtime providers in priority order
         # Padding moved to Audio section
     },
     'Output': {
@@ -62,137 +77,289 @@ DEFAULT_CONFIG = {
     }
 }
 
-# Initialize ConfigParser instance
-config = configparser.ConfigParser(
-    inline_comment_prefixes=('#', ';'),
-    interpolation=None # Disable interpolation to treat % signs literally
-)
+# Flat (section, key) -> default string view of DEFAULT_CONFIG, so getters do one dict lookup
+_DEFAULTS_FLAT = {(section, key): value for section, items in DEFAULT_CONFIG.items() for key, value in items.items()}
+# Freeze the defaults: the flat view above and _defaults() copies must not drift from them
+DEFAULT_CONFIG = MappingProxyType({section: MappingProxyType(items) for section, items in DEFAULT_CONFIG.items()})
+
+def _render_defaults(defaults):
+    """INI text for `defaults`, laid out like ConfigParser.write() output.
+
+    No escaping: the default keys and values contain no newlines, and keys no '='.
+    """
+    lines = []
+    for section, items in defaults.items():
+        lines.append(f"[{section}]")
+        lines.extend(f"{key} = {value}" for key, value in items.items())
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+# Written as-is when no config file exists
+_DEFAULT_INI_TEXT = _render_defaults(DEFAULT_CONFIG)
+_DEFAULT_INI_BYTES = _DEFAULT_INI_TEXT.encode()
+
+def _write_atomic(path, data):
+    """Writes `data` to a temp file next to `path` in one write(), syncs it and renames it into place.
+
+    Readers see either no file or the complete one, never a partial write.
+    """
+    tmp_path = path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+# Parsed config, resolved VALUES and compiled [Commands], valid for the config file version in 'key'
+_CACHE = {'key': None, 'config': None, 'values': None, 'values_source': None,
+          'commands': None, 'combined': None, 'anchors': None, 'scan': None}
+
+# Called with no arguments whenever load_config() (re)parses the file, so modules
+# that keep their own copies of settings can drop them
+_RELOAD_CALLBACKS = []
+
+def add_reload_callback(callback):
+    """Registers `callback()` to run each time the config is (re)loaded."""
+    _RELOAD_CALLBACKS.append(callback)
+
+def _config_file_key():
+    """(mtime_ns, size) of the config file, or None if it can't be stat'ed."""
+    try:
+        st = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 def load_config():
-    """Loads config, creates default if needed, returns config object."""
-    global config
+    """Returns the config object, loading it (and creating a default file) if needed.
+
+    Loaded on first use rather than at import. Later calls cost one stat() of the
+    file and return the same object unless it changed, in which case it is re-parsed
+    and cached settings are dropped.
+    """
+    global TEMP_AUDIO_DIR
+    key = _config_file_key()
+    if _CACHE['config'] is not None and key == _CACHE['key']:
+        return _CACHE['config']
+    config = _parse_config()
+    # Re-validate only if a section VALUES is built from changed (e.g. not for an edit to [Commands])
+    values_source = _values_source(config)
+    values = _CACHE['values'] if values_source == _CACHE['values_source'] else _resolve_values(config)
+    _CACHE.update(key=_config_file_key(), config=config, values=values, values_source=values_source, commands=None) # Re-stat: the default file may have just been written
+    _SETTINGS.clear() # Lookups memoized against the previous version are stale
+    # Expanded once per load; expanduser may look up the passwd database
+    TEMP_AUDIO_DIR = os.path.expanduser(config.get('Paths', 'temporary_audio_dir', fallback='/tmp'))
+    for callback in _RELOAD_CALLBACKS:
+        callback()
+    return config
+
+def _defaults():
+    """A fresh {section: {key: value}} copy of DEFAULT_CONFIG."""
+    return {section: dict(items) for section, items in DEFAULT_CONFIG.items()}
+
+def _parse_config():
+    """Reads defaults and the user's file into a new config object and validates it.
+
+    The file is parsed with fast_ini (two regexes over the whole text); the default
+    file written on first run is pre-rendered text.
+    """
     # --- Make Config Loading More Robust ---
-    # Reset parser and read defaults first to ensure all sections/defaults exist
-    config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'), interpolation=None)
-    config.read_dict(DEFAULT_CONFIG)
+    # Start from the defaults to ensure all sections/defaults exist
+    sections = _defaults()
 
     if not os.path.exists(CONFIG_FILE):
         print(f"Config file not found. Creating default at: {CONFIG_FILE}")
         try:
             os.makedirs(CONFIG_DIR, exist_ok=True)
-            # Write the fully populated config object (containing defaults)
-            with open(CONFIG_FILE, 'w') as configfile:
-                config.write(configfile)
+            _write_atomic(CONFIG_FILE, _DEFAULT_INI_BYTES) # Pre-rendered at import
             print("Default config file created. Please review it, especially [Commands].")
         except OSError as e:
             print(f"ERROR: Could not create default config: {e}", file=sys.stderr)
-            # Keep using internal defaults loaded via read_dict
-            return config # Return config object containing only defaults
+            # Keep using internal defaults
+            return fast_ini.FastConfig(sections) # Return config object containing only defaults
 
     try:
         # Read user's file, overriding defaults where specified
         # This will correctly load or override the [Commands] section too
-        loaded_files = config.read(CONFIG_FILE)
-        if loaded_files:
-            print(f"Loaded config from {CONFIG_FILE}")
-        else:
-             # This case should ideally not happen due to the creation logic above
-             # but good to handle if the file becomes unreadable later.
-             print(f"Warning: Could not read config file {CONFIG_FILE} though it exists. Using internal defaults.")
-             config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'), interpolation=None)
-             config.read_dict(DEFAULT_CONFIG)
-
-
-    except configparser.Error as e:
-        print(f"ERROR reading config file {CONFIG_FILE}: {e}", file=sys.stderr)
-        print("Using internal defaults.", file=sys.stderr)
-        # Reset to defaults on error after trying to load
-        config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'), interpolation=None)
-        config.read_dict(DEFAULT_CONFIG)
-
-    # --- Perform Validation (existing validation remains) ---
-    try:
-        get_int_setting('Audio', 'sample_rate')
-        get_int_setting('Audio', 'channels')
-        get_int_setting('Whisper', 'beam_size')
-        get_bool_setting('UI', 'show_notifications')
-        get_float_setting('VAD', 'speech_threshold')
-        get_int_setting('VAD', 'silence_duration_ms')
-        get_int_setting('VAD', 'frame_ms')
-        get_float_setting('Audio', 'leading_silence_s', allow_zero=True)
-        get_float_setting('Audio', 'trailing_silence_s', allow_zero=True)
+        with open(CONFIG_FILE, 'r') as configfile:
+            text = configfile.read()
+        for section, items in fast_ini.parse(text).items():
+            sections.setdefault(section, {}).update(items)
+        print(f"Loaded config from {CONFIG_FILE}")
+    except (OSError, UnicodeDecodeError) as e:
+        # This case should ideally not happen due to the creation logic above
+        # but good to handle if the file becomes unreadable later.
+        print(f"Warning: Could not read config file {CONFIG_FILE}: {e}. Using internal defaults.", file=sys.stderr)
+        sections = _defaults()
+    return fast_ini.FastConfig(sections)
+
+def _values_source(config):
+    """The raw items of every section that VALUES is built from; equal sources give equal VALUES."""
+    return tuple(tuple(config.items(section)) if config.has_section(section) else ()
+                 for section in _VALUES_SECTIONS)
+
+_SILERO_WINDOW_SIZES = MappingProxyType({8000: 256, 16000: 512}) # Silero VAD v5 accepts exactly these windows
+
+def _resolve_values(config):
+    """Validates the numeric/boolean settings and returns them as a frozen Values instance (cfg.VALUES).
+
+    Goes through the parser directly: the public getters call load_config() themselves.
+    One pass over the table; each value is read once and reused for the checks below.
+    """
+    try:
+        settings = {key: getter(config, section, key, **kwargs)
+                    for getter, section, key, kwargs in _VALIDATED_SETTINGS}
 
         # Check VAD requirements (existing code)
-        sr = get_int_setting('Audio', 'sample_rate')
-        if sr not in [8000, 16000]:
+        sr = settings['sample_rate']
+        if sr not in _SILERO_WINDOW_SIZES:
              logging.warning(f"VAD typically requires sample rate 8000 or 16000, configured: {sr}")
-        frame_ms = get_int_setting('VAD', 'frame_ms')
-        frame_size = int(sr * frame_ms / 1000)
-        valid_silero_sizes_16k = [256, 512, 768, 1024, 1536]
-        if sr == 16000 and frame_size not in valid_silero_sizes_16k:
-             logging.warning(f"Silero VAD frame_ms={frame_ms} results in frame size {frame_size} at {sr}Hz. Expected sizes: {valid_silero_sizes_16k}. VAD might fail.")
+        frame_ms = settings['frame_ms']
+        frame_size = int(sr * frame_ms / 1000) # Derived once per load
+        if sr in _SILERO_WINDOW_SIZES and frame_size != _SILERO_WINDOW_SIZES[sr]:
+             logging.warning(f"Silero VAD frame_ms={frame_ms} results in frame size {frame_size} at {sr}Hz. Expected size: {_SILERO_WINDOW_SIZES[sr]}. VAD will fail.")
 
     except ValueError as e:
         print(f"ERROR: Config file has invalid number format: {e}", file=sys.stderr)
         print("Please check numeric settings (e.g., sample_rate, threshold, durations).", file=sys.stderr)
         sys.exit(1) # Exit if fundamentally broken
 
-    return config
+    return Values(**settings, vad_frame_size=frame_size)
+
+def __getattr__(name):
+    """Provides `config_manager.config` (the loaded config), `VALUES` and `TEMP_AUDIO_DIR` without loading at import.
+
+    VALUES holds every setting in _VALIDATED_SETTINGS, already converted, as attributes
+    named after its key (e.g. `cfg.VALUES.sample_rate`), plus the derived `vad_frame_size`.
+    """
+    if name == 'config':
+        return load_config()
+    if name == 'VALUES':
+        load_config()
+        return _CACHE['values']
+    if name == 'TEMP_AUDIO_DIR': # Becomes a real module global once the config is loaded
+        load_config()
+        return TEMP_AUDIO_DIR
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Helper functions for getting settings (modified fallbacks slightly) ---
-def get_setting(section, key, fallback_value=None):
-    """Gets a string setting, falling back to default dict then provided fallback."""
-    default_from_dict = DEFAULT_CONFIG.get(section, {}).get(key)
+def _typed_fallback(section, key, convert, fallback_value):
+    """The default from DEFAULT_CONFIG converted with `convert`, or `fallback_value` if missing/invalid."""
+    default_from_dict_str = _DEFAULTS_FLAT.get((section, key))
+    try:
+        # Prioritize fallback_value if default dict entry is invalid or missing
+        return convert(default_from_dict_str) if default_from_dict_str is not None else fallback_value
+    except (ValueError, TypeError, AttributeError):
+        return fallback_value
+
+def _get_str(config, section, key, fallback_value=None):
+    default_from_dict = _DEFAULTS_FLAT.get((section, key))
     # Use provided fallback only if not found in user config AND not in default dict
     final_fallback = fallback_value if default_from_dict is None else default_from_dict
     return config.get(section, key, fallback=final_fallback)
 
-def get_int_setting(section, key, fallback_value=0):
-    """Gets an int setting, falling back safely."""
-    default_from_dict_str = DEFAULT_CONFIG.get(section, {}).get(key)
-    try:
-        # Prioritize fallback_value if default dict entry is invalid or missing
-        final_fallback = int(default_from_dict_str) if default_from_dict_str is not None else fallback_value
-    except (ValueError, TypeError):
-        final_fallback = fallback_value
-
+def _get_int(config, section, key, fallback_value=0):
+    final_fallback = _typed_fallback(section, key, int, fallback_value)
     try:
         return config.getint(section, key, fallback=final_fallback)
     except (ValueError, TypeError):
         print(f"Warning: Invalid integer for [{section}]{key}. Using fallback {final_fallback}.", file=sys.stderr)
         return final_fallback
 
-def get_float_setting(section, key, fallback_value=0.0):
-    """Gets a float setting, falling back safely."""
-    default_from_dict_str = DEFAULT_CONFIG.get(section, {}).get(key)
+def _get_float(config, section, key, fallback_value=0.0, allow_zero=False):
+    final_fallback = _typed_fallback(section, key, float, fallback_value)
     try:
-        final_fallback = float(default_from_dict_str) if default_from_dict_str is not None else fallback_value
-    except (ValueError, TypeError):
-        final_fallback = fallback_value
-
-    try:
-        return config.getfloat(section, key, fallback=final_fallback)
+        value = config.getfloat(section, key, fallback=final_fallback)
     except (ValueError, TypeError):
         print(f"Warning: Invalid float for [{section}]{key}. Using fallback {final_fallback}.", file=sys.stderr)
         return final_fallback
+    if value == 0 and not allow_zero:
+        print(f"Warning: [{section}]{key} cannot be 0. Using fallback {final_fallback}.", file=sys.stderr)
+        return final_fallback
+    return value
 
-def get_bool_setting(section, key, fallback_value=False):
-    """Gets a boolean setting, falling back safely."""
-    default_from_dict_str = DEFAULT_CONFIG.get(section, {}).get(key)
-    try:
-        final_fallback = default_from_dict_str.lower() == 'true' if default_from_dict_str is not None else fallback_value
-    except AttributeError: # Handle if default is not string
-         final_fallback = bool(default_from_dict_str) if default_from_dict_str is not None else fallback_value
-
+def _get_bool(config, section, key, fallback_value=False):
+    final_fallback = _typed_fallback(section, key, lambda v: v.lower() == 'true', fallback_value)
     try:
         return config.getboolean(section, key, fallback=final_fallback)
     except (ValueError, TypeError):
         print(f"Warning: Invalid boolean for [{section}]{key}. Using fallback {final_fallback}.", file=sys.stderr)
         return final_fallback
 
+# Settings checked (and warned about) when the config is loaded: (getter, section, key, extra kwargs).
+# The results are exposed as cfg.VALUES.<key>, so keys must be unique across sections.
+_VALIDATED_SETTINGS = (
+    (_get_int, 'Audio', 'sample_rate', {}),
+    (_get_int, 'Audio', 'channels', {}),
+    (_get_int, 'Whisper', 'beam_size', {}),
+    (_get_int, 'Whisper', 'cpu_threads', {}),
+    (_get_bool, 'Whisper', 'greedy', {}),
+    (_get_bool, 'Whisper', 'decode_in_process', {}),
+    (_get_bool, 'UI', 'show_notifications', {}),
+    (_get_float, 'VAD', 'speech_threshold', {}),
+    (_get_int, 'VAD', 'silence_duration_ms', {}),
+    (_get_int, 'VAD', 'frame_ms', {}),
+    (_get_float, 'VAD', 'noise_floor', {'allow_zero': True}),
+    (_get_float, 'Audio', 'leading_silence_s', {'allow_zero': True}),
+    (_get_float, 'Audio', 'trailing_silence_s', {'allow_zero': True}),
+)
+
+_VALUES_SECTIONS = tuple(dict.fromkeys(section for _, section, _, _ in _VALIDATED_SETTINGS))
+
+# Type of cfg.VALUES: one typed field per validated setting plus derived values. Frozen
+# and slotted, so reads are slot loads and nothing can change a loaded config in place.
+Values = dataclasses.make_dataclass(
+    'Values',
+    [(key, {_get_int: int, _get_float: float, _get_bool: bool}[getter]) for getter, _, key, _ in _VALIDATED_SETTINGS]
+    + [('vad_frame_size', int)],
+    frozen=True, slots=True)
+
+# (lookup, section, key, *args) -> value for the loaded config; cleared by load_config() on reload
+_SETTINGS = {}
+
+def _memoized(lookup, *args):
+    """lookup(config, *args) against the current config, resolved once per load."""
+    config = load_config() # Every getter goes through here, so a reload is always seen
+    try:
+        return _SETTINGS[(lookup, *args)]
+    except KeyError:
+        value = _SETTINGS[(lookup, *args)] = lookup(config, *args)
+        return value
+
+def get_setting(section, key, fallback_value=None):
+    """Gets a string setting, falling back to default dict then provided fallback."""
+    return _memoized(_get_str, section, key, fallback_value)
+
+def get_int_setting(section, key, fallback_value=0):
+    """Gets an int setting, falling back safely."""
+    return _memoized(_get_int, section, key, fallback_value)
+
+def get_float_setting(section, key, fallback_value=0.0, allow_zero=False):
+    """Gets a float setting, falling back safely. 0 is rejected unless `allow_zero`."""
+    return _memoized(_get_float, section, key, fallback_value, allow_zero)
+
+def get_bool_setting(section, key, fallback_value=False):
+    """Gets a boolean setting, falling back safely."""
+    return _memoized(_get_bool, section, key, fallback_value)
+
 def get_temp_audio_dir():
-    dir_path = get_setting('Paths', 'temporary_audio_dir', fallback_value='/tmp')
-    return os.path.expanduser(dir_path)
+    """The expanded [Paths] temporary_audio_dir, also available as cfg.TEMP_AUDIO_DIR."""
+    try:
+        return TEMP_AUDIO_DIR
+    except NameError: # Config not loaded yet
+        load_config()
+        return TEMP_AUDIO_DIR
+
+def reload_config():
+    """Loads the file again even if it looks unchanged, dropping every cached setting."""
+    _CACHE.update(config=None, values_source=None)
+    return load_config()
 
 # --- NEW: Function to parse and retrieve commands ---
 def get_commands():
@@ -201,10 +368,169 @@ def get_commands():
 
     Returns:
         dict: A dictionary where keys are trigger names and values are
-              dicts {'regex': compiled_regex_object, 'action': action_string}.
+              dicts {'regex': compiled_regex_object, 'action': action_string,
+              'anchor': casefolded literal every match contains, or '',
+              'argv': pre-split action for direct exec, or None if it needs /bin/sh}.
               Returns an empty dict if the section is missing or empty.
+
+    The regexes are compiled once per version of the config file; later calls
+    return the same dict.
+    """
+    config = load_config()
+    if _CACHE['commands'] is None:
+        commands = _build_commands(config)
+        anchors = tuple(command['anchor'] for command in commands.values())
+        _CACHE.update(commands=commands, combined=_combine_commands(commands), scan=_scan_database(commands),
+                      anchors=anchors if all(anchors) else None) # Only usable to reject text if every command has one
+    return _CACHE['commands']
+
+def match_command(text):
+    """Finds the first command whose regex matches all of `text` (case-insensitive).
+
+    Returns (name, command, groups) or None, where `groups` are the command's own
+    capture groups, numbered as written in config.ini.
     """
+    commands = get_commands()
+    folded = text.casefold()
+    anchors = _CACHE['anchors']
+    if anchors is not None and not any(anchor in folded for anchor in anchors):
+        return None # Plain dictation: no command's required literal occurs, skip the regex engine
+    scan = _CACHE['scan']
+    if scan is not None: # Many commands: one Hyperscan pass finds the candidates
+        database, names = scan
+        hits = []
+        database.scan(text.encode(), match_event_handler=lambda index, *_: hits.append(index))
+        for index in sorted(hits): # Config order, so the first matching command still wins
+            name = names[index]
+            match = commands[name]['regex'].fullmatch(text) # Confirm, and get the groups
+            if match:
+                return name, commands[name], match.groups()
+        return None
+    combined = _CACHE['combined']
+    if combined is None: # Patterns that couldn't be combined: try them one by one
+        for name, command in commands.items():
+            if command['anchor'] not in folded:
+                continue
+            match = command['regex'].fullmatch(text)
+            if match:
+                return name, command, match.groups()
+        return None
+    pattern, slots = combined
+    hit = pattern.fullmatch(text) # Alternatives are tried in order, so the first matching command wins
+    if hit is None:
+        return None
+    name, start, stop = slots[hit.lastgroup] # The wrapping group closes last, so it is lastgroup
+    return name, commands[name], hit.groups()[start:stop]
+
+def _required_literal(pattern, flags=re.IGNORECASE):
+    """Longest run of ASCII literal characters every match of `pattern` contains, casefolded; '' if none.
+
+    Only top-level literals (and those inside plain groups) count: anything under a
+    branch, optional part or repeat may be absent from a match.
+    """
+    try:
+        items = list(_re_parser.parse(pattern, flags))
+    except Exception: # Let the real compile report bad patterns
+        return ''
+    best = run = ''
+    while items:
+        op, arg = items.pop(0)
+        if op is _re_parser.SUBPATTERN:
+            items[:0] = list(arg[-1]) # Contents of a group are matched in place
+        elif op is _re_parser.LITERAL and arg < 128:
+            run += chr(arg)
+        else:
+            best = max(best, run, key=len)
+            run = ''
+    return max(best, run, key=len).casefold()
+
+# Numbered backreference (\1) or conditional ((?(1)...)) in a command regex
+_NUMBERED_REF_RE = re.compile(r'\\[1-9]|\(\?\(\d')
+
+def _combine_commands(commands):
+    """One alternation of every command regex, each wrapped in a named group.
+
+    Returns (pattern, {group name: (command name, start, stop)}), where
+    `groups()[start:stop]` of a combined match are that command's own groups; or
+    None if the patterns can't share one regex (e.g. global inline flags, numbered
+    backreferences, clashing group names).
+    """
+    if not commands:
+        return None
+    if any(_NUMBERED_REF_RE.search(command['regex'].pattern) for command in commands.values()):
+        return None # Group numbers shift inside the alternation
+    names = {f'_cmd{i}': name for i, name in enumerate(commands)}
+    alternation = '|'.join(f'(?P<{group}>{commands[name]["regex"].pattern})' for group, name in names.items())
+    try:
+        pattern = re.compile(alternation, re.IGNORECASE)
+    except re.error as e:
+        logging.debug("Command regexes can't be combined, matching them one by one: %s", e)
+        return None
+    slots = {}
+    for group, name in names.items():
+        start = pattern.groupindex[group] # 1-based number of the wrapper = 0-based index of its first inner group
+        slots[group] = (name, start, start + commands[name]['regex'].groups)
+    return pattern, slots
+
+HYPERSCAN_MIN_COMMANDS = 16 # Below this the combined `re` alternation is just as fast
+
+def _scan_database(commands):
+    """(Hyperscan database of every command regex, command names by id), or None.
+
+    Used only with many commands and when the optional `hyperscan` package is
+    installed and accepts every pattern. Compiled in prefilter mode, so it may report
+    a command whose regex doesn't match but never misses one that does: match_command
+    confirms each candidate with `re`.
+    """
+    if len(commands) < HYPERSCAN_MIN_COMMANDS:
+        return None
+    try:
+        import hyperscan
+    except ImportError:
+        return None
+    names = list(commands)
+    flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+             | hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH)
+    database = hyperscan.Database()
+    try:
+        database.compile(expressions=[f'^(?:{commands[name]["regex"].pattern})$'.encode() for name in names],
+                         ids=list(range(len(names))), elements=len(names), flags=[flags] * len(names))
+    except Exception as e: # Syntax Hyperscan doesn't support
+        logging.debug("Command regexes can't be compiled with Hyperscan, using re: %s", e)
+        return None
+    return database, names
+
+# Shell syntax an argv can't express (and glob characters); actions using any of it run through /bin/sh
+_SHELL_SYNTAX_RE = re.compile(r'[|&;<>()$`*?\[\]{}#\n]')
+_PLACEHOLDER_RE = re.compile(r'\{\d*\}') # {0}, {1}, {} format fields
+
+_NOTE_ACTIONS = (('NEW_NOTE::', 'new_note'), ('APPEND_NOTE::', 'append_note'))
+
+def _action_kind(action):
+    """The action's kind ('new_note', 'append_note' or 'shell') and, for notes, its expanded path."""
+    for prefix, kind in _NOTE_ACTIONS:
+        if action.startswith(prefix):
+            return kind, os.path.expanduser(action[len(prefix):])
+    return 'shell', None
+
+def _action_argv(action):
+    """The shell action split into an argv tuple (words starting with ~ expanded, {N} fields kept
+    for formatting), or None if it needs the shell.
+    """
+    if _SHELL_SYNTAX_RE.search(_PLACEHOLDER_RE.sub('', action)):
+        return None
+    try:
+        argv = shlex.split(action)
+    except ValueError: # Unbalanced quotes: let the shell report it
+        return None
+    if not argv or '=' in argv[0]: # Empty, or a VAR=value prefix
+        return None
+    return tuple(os.path.expanduser(arg) if arg.startswith('~') else arg for arg in argv)
+
+def _build_commands(config):
     commands = {}
+    compile_regex = re.compile # Bound once for the loop
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
     if not config.has_section('Commands'):
         logging.warning("No [Commands] section found in config.")
         return commands
@@ -221,12 +547,18 @@ def get_commands():
             try:
                 # Compile the regex for efficiency and validation
                 # Add re.IGNORECASE if case-insensitivity is desired by default
-                compiled_regex = re.compile(regex_pattern, re.IGNORECASE) # Added IGNORECASE
+                compiled_regex = compile_regex(regex_pattern, re.IGNORECASE) # Added IGNORECASE
+                # Action decoded here, once per config version, rather than on every execution
+                kind, target = _action_kind(action)
                 commands[trigger_name] = {
                     'regex': compiled_regex,
-                    'action': action
+                    'action': action,
+                    'anchor': _required_literal(regex_pattern),
+                    'kind': kind,
+                    'target': target, # Note directory/file for note actions
+                    'argv': _action_argv(action) if kind == 'shell' else None,
                 }
-                logging.debug(f"Loaded command '{trigger_name}': regex='{regex_pattern}', action='{action}'")
+                if debug: logging.debug("Loaded command '%s': regex='%s', action='%s'", trigger_name, regex_pattern, action)
             except re.error as e:
                 logging.warning(f"Skipping invalid command '{trigger_name}': Invalid regex pattern '{regex_pattern}'. Error: {e}")
 
@@ -239,10 +571,8 @@ def get_commands():
     return commands
 
 
-# --- Load config when the module is imported ---
-# Ensure logging is configured before this if warnings are important at startup
-logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s') # Example basic config
-config = load_config()
+# --- Config is loaded on first use (see load_config) ---
+# Logging is configured by the application (main.py), not here
 
 # You can now import 'get_commands' from this module elsewhere in your app
 # Example usage in another file:
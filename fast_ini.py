@@ -0,0 +1,76 @@
+import configparser
+import re
+
+# Minimal INI reader for config.ini's known shape: `[section]` headers and
+# `key = value` lines, `#`/`;` comments, no interpolation or continuation lines.
+# Two precompiled regexes over the whole text replace configparser's per-line
+# state machine. Inline comments are cut by _KV_RE's value group in the same
+# pass. As with configparser's inline_comment_prefixes, an inline comment needs
+# whitespace right before it, so `#`/`;` inside values (e.g. regexes) are kept,
+# and `\#`/`\;` keep a spaced one literal. Backslashes are left in the value,
+# where both `re` and the shell read `\#` as `#`.
+_SECTION_RE = re.compile(r'^\[([^\]]+)\][ \t\r]*$', re.M)
+_KV_RE = re.compile(r'^([^=#;\s][^=\n]*?)[ \t]*=[ \t]*(.*?)(?:[ \t]+[#;].*)?[ \t\r]*$', re.M)
+
+_BOOLEAN_STATES = configparser.ConfigParser.BOOLEAN_STATES
+_UNSET = object()
+
+def parse(text):
+    """Parses INI text into {section: {key: value}}. Keys are lower-cased like configparser's."""
+    result = {}
+    headers = list(_SECTION_RE.finditer(text))
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        items = result.setdefault(header.group(1).strip(), {})
+        for match in _KV_RE.finditer(text, header.end(), end):
+            items[match.group(1).lower()] = match.group(2)
+    return result
+
+class FastConfig:
+    """Read-only stand-in for the ConfigParser methods the app uses, over a {section: {key: value}} dict."""
+
+    def __init__(self, sections):
+        self._sections = sections
+
+    def sections(self):
+        return list(self._sections)
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def has_option(self, section, option):
+        return option.lower() in self._sections.get(section, ())
+
+    def items(self, section):
+        if section not in self._sections:
+            raise configparser.NoSectionError(section)
+        return list(self._sections[section].items())
+
+    def get(self, section, option, *, fallback=_UNSET):
+        try:
+            return self._sections[section][option.lower()]
+        except KeyError:
+            if fallback is not _UNSET:
+                return fallback
+            if section not in self._sections:
+                raise configparser.NoSectionError(section) from None
+            raise configparser.NoOptionError(option, section) from None
+
+    def _get_converted(self, convert, section, option, fallback):
+        value = self.get(section, option, fallback=_UNSET if fallback is _UNSET else None)
+        if value is None:
+            return fallback
+        return convert(value)
+
+    def getint(self, section, option, *, fallback=_UNSET):
+        return self._get_converted(int, section, option, fallback)
+
+    def getfloat(self, section, option, *, fallback=_UNSET):
+        return self._get_converted(float, section, option, fallback)
+
+    def getboolean(self, section, option, *, fallback=_UNSET):
+        def convert(value):
+            if value.lower() not in _BOOLEAN_STATES:
+                raise ValueError(f"Not a boolean: {value}")
+            return _BOOLEAN_STATES[value.lower()]
+        return self._get_converted(convert, section, option, fallback)
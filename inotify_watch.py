@@ -0,0 +1,75 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+
+# Minimal ctypes binding for Linux inotify, used to watch the signal directory
+# directly instead of through a watchdog observer thread. The fd is non-blocking,
+# so it can sit in select() or a GLib main loop and is only read when the kernel
+# reports an event.
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000 # Kernel queue overflowed; events were dropped
+
+_EVENT = struct.Struct('iIII') # struct inotify_event: wd, mask, cookie, len (name follows)
+_READ_SIZE = 4096 # Room for many events; one event is at most 16 + NAME_MAX + 1 bytes
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    inotify_available = True
+except (OSError, AttributeError):
+    inotify_available = False
+
+class InotifyWatcher:
+    """Non-blocking inotify fd watching one directory for `mask` events.
+
+    If `names` is given, read_names() only reports those file names; other events
+    (e.g. unrelated files in /tmp) are skipped on the raw bytes, before decoding.
+    """
+
+    def __init__(self, path, mask=IN_CREATE | IN_MOVED_TO, names=None):
+        if not inotify_available:
+            raise OSError("inotify is not available on this system")
+        fd = _inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        if _inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno), path)
+        self._fd = fd
+        self._names = None if names is None else frozenset(os.fsencode(name) for name in names)
+        self.overflowed = False # Set when events were lost; the caller should rescan and clear it
+
+    def fileno(self):
+        return self._fd
+
+    def read_names(self):
+        """Drains pending events and returns the file names they refer to, oldest first."""
+        names = []
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_len = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                # The name is NUL-padded to an aligned length
+                name = data[offset:offset + name_len].rstrip(b'\0')
+                offset += name_len
+                if self._names is None or name in self._names:
+                    names.append(os.fsdecode(name))
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
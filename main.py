@@ -1,21 +1,18 @@
 #!/usr/bin/env python
 import time
 import os
+import atexit
 import sys
 import signal # For handling termination signals
 import logging
 import queue
+import select
+import shutil
 import threading
 
-# --- Watchdog for file signals ---
-try:
-    from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler, FileCreatedEvent
-    watchdog_available = True
-except ImportError:
-    print("Warning: 'watchdog' library not found. Falling back to polling.", file=sys.stderr)
-    print("Install it for better performance: pip install watchdog", file=sys.stderr)
-    watchdog_available = False
+# Root logging is configured once here, by the application, before the project
+# modules (which only call getLogger) log anything
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 # --- GTK / GLib for main loop and scheduling ---
 try:
@@ -33,57 +30,163 @@ except ImportError:
 
 # --- Project Modules ---
 import config_manager as cfg
-from utils import send_notification, logger, set_notify_send_available, run_command # Use shared logger
-from audio_recorder import AudioRecorder
-from asr_processor import WhisperProcessor
-from output_handler import handle_output
+from utils import send_notification, logger, set_notify_send_available # Use shared logger
+# audio_recorder, asr_processor and output_handler are imported where first used:
+# they pull in sounddevice/onnxruntime/faster-whisper/pynput, which dominate startup time.
+from spsc_ring import ObjectRing
+from inotify_watch import InotifyWatcher
 
 # --- Global State ---
+TRANSCRIPTION_QUEUE_SIZE = 32 # Segments (up to 30s each) waiting for Whisper; more are dropped
+OUTPUT_QUEUE_SIZE = 32 # Transcriptions waiting for the main thread to output them
 recorder = None
 processor = None
 keep_running = True # Flag to control main loop and threads
 asr_active = False # Is the ASR processing currently active/unpaused?
-transcription_queue = queue.Queue() # Queue for audio segments from recorder
-observer = None # Watchdog observer thread
-
-signal_dir = cfg.get_temp_audio_dir() # Use configured temp dir for signals too
-start_signal_file = os.path.join(signal_dir, "asr_start_signal")
-stop_signal_file = os.path.join(signal_dir, "asr_stop_signal") # This now means PAUSE
+transcription_queue = ObjectRing(TRANSCRIPTION_QUEUE_SIZE) # Lock-free SPSC handoff of (segment view, release token) from the recorder
+signal_watcher = None # inotify watch on signal_dir, read from the main thread
+control_fd = None # Read end of the control FIFO
+# eventfd written by shutdown_handler to wake the epoll loop. Created at import so a
+# signal can never arrive before it exists; non-blocking so the handler never stalls.
+shutdown_event_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+# Transcriptions go back to the main thread through output_queue; the worker writes a
+# byte to this self-pipe per text so the main loop wakes up on its read end.
+output_queue = ObjectRing(OUTPUT_QUEUE_SIZE)
+output_pipe_r, output_pipe_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+
+signal_dir = cfg.TEMP_AUDIO_DIR # Use configured temp dir for signals too
+START_SIGNAL_NAME = "asr_start_signal"
+STOP_SIGNAL_NAME = "asr_stop_signal" # This now means PAUSE
+SIGNAL_NAMES = frozenset((START_SIGNAL_NAME, STOP_SIGNAL_NAME))
+start_signal_file = os.path.join(signal_dir, START_SIGNAL_NAME)
+stop_signal_file = os.path.join(signal_dir, STOP_SIGNAL_NAME)
+# trigger_asr.py writes one byte per signal here; the signal files remain for older clients
+control_fifo = os.path.join(signal_dir, "asr_control.fifo")
+CONTROL_START = 1
+CONTROL_STOP = 2
+# trigger_asr.py's other channel, e.g. when the FIFO was removed from under us
+CONTROL_SIGNALS = {signal.SIGUSR1: CONTROL_START, signal.SIGUSR2: CONTROL_STOP}
 pid_file = os.path.join(signal_dir, "asr_service.pid")
 logger.info(f"Using signal directory: {signal_dir}") # Add this line
-try:
-     with open(pid_file, 'w') as f: # pid_file uses signal_dir
-         f.write(str(os.getpid()))
-     logger.info(f"PID file created at {pid_file}") # Add confirmation log
-except IOError as e:
-     logger.warning(f"Could not write PID file {pid_file}: {e}")
-# --- File Signal Event Handler (Watchdog) ---
-class SignalHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        # Use isinstance check for reliability
-        if isinstance(event, FileCreatedEvent):
-            logger.debug(f"Watchdog detected creation: {event.src_path}")
-            if event.src_path == start_signal_file:
-                logger.info("Start/Resume signal file detected.")
-                # Schedule action in GLib main loop if possible
-                if gi_available: GLib.idle_add(handle_start_resume_signal)
-                else: handle_start_resume_signal() # Run directly if no GLib
-                safe_remove(start_signal_file)
-            elif event.src_path == stop_signal_file:
-                logger.info("Stop/Pause signal file detected.")
-                if gi_available: GLib.idle_add(handle_pause_signal)
-                else: handle_pause_signal() # Run directly if no GLib
-                safe_remove(stop_signal_file)
+
+def running_pid():
+    """PID recorded in pid_file if that process is still alive, else None (no file, or a stale one)."""
+    try:
+        with open(pid_file, 'rb') as f:
+            pid = int(f.read())
+        os.kill(pid, 0) # Signal 0: existence check only
+    except PermissionError: # Alive, but owned by another user
+        return pid
+    except (OSError, ValueError): # Missing, unreadable/garbage, or ProcessLookupError
+        return None
+    return pid
+
+def write_pid_file():
+    """Creates pid_file holding our PID with one unbuffered write().
+
+    Created with O_EXCL, so a second instance fails here instead of overwriting the
+    first one's PID; a file left behind by a dead process is replaced. Returns False
+    if another instance is running.
+    """
+    for _ in range(2): # Retry once after removing a stale file
+        try:
+            fd = os.open(pid_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC, 0o644)
+        except FileExistsError:
+            pid = running_pid()
+            if pid is not None and pid != os.getpid():
+                logger.error(f"{cfg.APP_NAME} is already running (PID {pid}).")
+                return False
+            logger.info(f"Removing stale PID file {pid_file}")
+            safe_remove(pid_file)
+            continue
+        except OSError as e:
+            logger.warning(f"Could not write PID file {pid_file}: {e}")
+            return True # Not fatal: only trigger_asr.py's service check relies on it
+        try:
+            os.write(fd, b'%d' % os.getpid())
+        finally:
+            os.close(fd)
+        atexit.register(safe_remove, pid_file) # Removed on every normal exit path, only once we own it
+        logger.info(f"PID file created at {pid_file}")
+        return True
+    logger.warning(f"Could not create PID file {pid_file}: it keeps reappearing.")
+    return True
+
+# --- File Signal Events (inotify) ---
+def handle_signal_events(*_args):
+    """Reads pending inotify events on signal_dir and runs the matching handlers.
+
+    Always called on the main thread (GLib IO watch or the epoll loop), so the
+    handlers run directly. Returns True to keep the GLib watch installed.
+    """
+    names = signal_watcher.read_names()
+    if signal_watcher.overflowed:
+        # The kernel dropped events: look for signal files directly, one directory read
+        signal_watcher.overflowed = False
+        logger.warning("inotify queue overflowed, rescanning the signal directory.")
+        with os.scandir(signal_dir) as entries:
+            names += [entry.name for entry in entries if entry.name in SIGNAL_NAMES and entry.name not in names]
+    for name in names: # Only signal file names; the watcher drops the rest
+        if name == START_SIGNAL_NAME:
+            logger.info("Start/Resume signal file detected.")
+            handle_start_resume_signal()
+            safe_remove(start_signal_file)
+        elif name == STOP_SIGNAL_NAME:
+            logger.info("Stop/Pause signal file detected.")
+            handle_pause_signal()
+            safe_remove(stop_signal_file)
+    return True
+
+# --- Control FIFO ---
+def open_control_fifo():
+    """Creates the control FIFO and opens it non-blocking.
+
+    Opened read-write so the fd never reports EOF when a trigger closes its end.
+    """
+    safe_remove(control_fifo) # Stale FIFO or file from a previous run
+    os.mkfifo(control_fifo, 0o600)
+    return os.open(control_fifo, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+
+def handle_control_fifo(*_args):
+    """Reads every pending control byte in one go and runs the matching handlers. Returns True for GLib."""
+    try:
+        data = os.read(control_fd, 4096)
+    except BlockingIOError:
+        return True
+    for code in data:
+        if code == CONTROL_START:
+            logger.info("Start/Resume signal received.")
+            handle_start_resume_signal()
+        elif code == CONTROL_STOP:
+            logger.info("Stop/Pause signal received.")
+            handle_pause_signal()
+        else:
+            logger.warning(f"Ignoring unknown control code {code}")
+    return True
+
+def handle_control_signal(signum, _frame=None):
+    """SIGUSR1 (start) / SIGUSR2 (stop): queues the matching code on our own end of the control FIFO.
+
+    It is then dispatched by handle_control_fifo like one a trigger wrote. A single
+    non-blocking write, so it is safe in a signal handler. Dropped before the FIFO is open.
+    """
+    if control_fd is not None:
+        try:
+            os.write(control_fd, bytes((CONTROL_SIGNALS[signum],)))
+        except OSError:
+            pass # FIFO full: plenty of codes are already pending
+    return True # Keep the GLib source
 
 def safe_remove(filepath):
     try:
-        if os.path.exists(filepath):
-             os.remove(filepath)
-             logger.debug(f"Removed signal file: {filepath}")
+        os.remove(filepath) # No exists() check first: one syscall, and no race with the file vanishing
+        logger.debug("Removed signal file: %s", filepath)
+    except FileNotFoundError:
+        pass
     except OSError as e:
         logger.error(f"Error removing signal file {filepath}: {e}")
 
-# --- Action Handlers (Called by Signal Handler or Polling) ---
+# --- Action Handlers (Called by handle_signal_events) ---
 def handle_start_resume_signal():
     """Starts audio stream if not running, or sets state to active."""
     global recorder, asr_active
@@ -124,41 +227,68 @@ def handle_pause_signal():
 
     return False # For GLib.idle_add
 
+def handle_output_pipe(*_args):
+    """Outputs every queued transcription on one wakeup. Returns True for GLib."""
+    try:
+        os.read(output_pipe_r, 256) # All pending wakeup bytes in one read (the queue holds fewer)
+    except BlockingIOError:
+        pass
+    from output_handler import handle_output # Already imported by the time text arrives
+    # Drain the queue rather than one text per byte: a burst of segments costs one wakeup.
+    # Texts put after the read above also wrote a byte, so at worst that wakeup finds nothing.
+    while True:
+        try:
+            text = output_queue.get(timeout=0)
+        except queue.Empty:
+            return True
+        try:
+            handle_output(text)
+        except Exception as e: # Keep the watch installed and the rest of the batch going
+            logger.error(f"Error handling transcription output: {e}", exc_info=True)
+
 # --- Transcription Worker ---
 def transcription_worker():
-    """Thread function to process audio segments from the queue."""
-    global processor, keep_running, asr_active, transcription_queue
+    """Thread function to process audio segments from the queue.
+
+    This is the single long-lived consumer: it runs for the whole service lifetime
+    and feeds every segment to the one persistent WhisperModel, so the model and
+    CTranslate2's thread pool stay loaded and warm between utterances.
+    """
+    global processor, recorder, keep_running, asr_active, transcription_queue
+    import output_handler # Loaded here, off the main thread, before the first text is ready
     logger.info("Transcription worker thread started.")
+    transcribe = processor.transcribe # Processor and recorder are created before this thread starts
+    release_segment = recorder.release_segment
 
     while keep_running:
         try:
-            # Wait for an audio segment with a timeout
-            audio_segment = transcription_queue.get(timeout=0.5)
+            # Sleep until the recorder queues a segment, or shutdown closes the queue
+            audio_segment, segment_token = transcription_queue.get()
 
             if not asr_active:
+                release_segment(segment_token)
                 logger.debug("ASR paused, skipping transcription of queued segment.")
-                transcription_queue.task_done() # Mark item as processed even if skipped
                 continue
 
-            if processor:
-                logger.info("Processing audio segment...")
-                transcribed_text = processor.transcribe(audio_segment) # Pass numpy array directly
-                if transcribed_text is not None: # Check for transcription success
-                    # Schedule output handling in main thread if using GTK/GLib
-                    if gi_available:
-                        GLib.idle_add(handle_output, transcribed_text)
-                    else:
-                        handle_output(transcribed_text) # Run directly (might block if typing is slow)
+            logger.info("Processing audio segment...")
+            try:
+                transcribed_text = transcribe(audio_segment) # A view into the recorder's segment arena
+            finally:
+                release_segment(segment_token) # The recorder may now reuse those samples
+            if transcribed_text == '':
+                logger.info("No speech in segment, nothing to output.") # Judged silent by the processor
+            elif transcribed_text is not None: # Check for transcription success
+                # Output is handled on the main thread, which the pipe byte wakes
+                if output_queue.put(transcribed_text):
+                    os.write(output_pipe_w, b'\0')
                 else:
-                    logger.error("Transcription failed for segment.")
-                    # Send error notification? (Handled in processor maybe)
+                    logger.warning("Output queue full, dropping transcription.")
             else:
-                logger.error("Processor not available for transcription.")
-
-            transcription_queue.task_done() # Signal queue that item is processed
+                logger.error("Transcription failed for segment.")
+                # Send error notification? (Handled in processor maybe)
 
         except queue.Empty:
-            # Timeout occurred, just loop again and check keep_running
+            # Queue closed: loop again and find keep_running cleared
             continue
         except Exception as e:
             logger.error(f"Error in transcription worker: {e}", exc_info=True)
@@ -171,28 +301,22 @@ def transcription_worker():
 # --- Graceful Shutdown Handler ---
 def shutdown_handler(signum, frame):
     """Handles SIGINT/SIGTERM for graceful shutdown."""
-    global keep_running, recorder, observer, transcription_thread
+    global keep_running, recorder, transcription_thread
     if not keep_running: return # Avoid multiple calls
     logger.info(f"Received signal {signum}. Shutting down...")
     keep_running = False # Signal loops to stop
+    transcription_queue.close() # Wake the transcription worker
 
-    # Stop watchdog first
-    if observer and observer.is_alive():
-        try: observer.stop()
-        except Exception as e: logger.error(f"Error stopping observer: {e}")
+    # Wake the epoll loop
+    try: os.eventfd_write(shutdown_event_fd, 1)
+    except OSError: pass # Counter saturated: a wakeup is already pending
 
     # Stop audio recorder stream
     if recorder and recorder.is_recording_active:
         logger.info("Stopping audio stream...")
         recorder.stop_recording() # Should be quick
 
-    # Wait for threads to finish (with timeout)
-    if observer and observer.is_alive():
-         logger.info("Waiting for observer thread...")
-         observer.join(timeout=1.0)
-         if observer.is_alive(): logger.warning("Observer thread did not exit.")
-
-    # Transcription worker will exit due to keep_running flag and queue timeout
+    # Transcription worker will exit due to keep_running flag once the closed queue wakes it
 
     # No GTK main loop to quit if not using AppIndicator
 
@@ -201,32 +325,34 @@ def shutdown_handler(signum, frame):
 
 # --- Main Service Function ---
 def main_service():
-    global recorder, processor, observer, keep_running, transcription_thread
+    global recorder, processor, signal_watcher, control_fd, keep_running, transcription_thread
 
     # --- Initial Setup ---
     logger.info(f"Starting {cfg.APP_NAME} Service...")
+    # Before the PID file exists, so a trigger can't SIGUSR1 us while the default action is to terminate
+    for signum in CONTROL_SIGNALS:
+        signal.signal(signum, handle_control_signal)
     # Write PID file
-    try:
-         with open(pid_file, 'w') as f: f.write(str(os.getpid()))
-    except IOError as e: logger.warning(f"Could not write PID file {pid_file}: {e}")
+    if not write_pid_file():
+        return 1
 
     # Check notify-send availability (utils function sets global flag)
-    set_notify_send_available(run_command(['which', 'notify-send']) is not None)
+    set_notify_send_available(shutil.which('notify-send') is not None) # PATH lookup in-process, no `which` fork
 
     # Initialize components
     try:
         # Queue must exist before recorder
         transcription_thread = threading.Thread(target=transcription_worker, daemon=True)
 
+        from audio_recorder import AudioRecorder
+        from asr_processor import WhisperProcessor
         recorder = AudioRecorder(transcription_queue) # Pass the queue
         processor = WhisperProcessor() # Loads model on init
         if processor.model is None:
              logger.critical("Failed to load Whisper model on startup. Exiting.")
-             safe_remove(pid_file)
              return 1 # Exit code for failure
     except Exception as e:
         logger.critical(f"Failed during initialization: {e}", exc_info=True)
-        safe_remove(pid_file)
         return 1
 
     # Clean up any stale signal files
@@ -236,32 +362,34 @@ def main_service():
     # --- Start Background Threads ---
     transcription_thread.start()
 
-    # --- Start Watchdog or Polling ---
-    if watchdog_available:
-        event_handler = SignalHandler()
-        observer = Observer()
-        try:
-            observer.schedule(event_handler, signal_dir, recursive=False)
-            observer.start()
-            logger.info(f"File system observer started watching {signal_dir}.")
-        except Exception as e:
-             logger.error(f"Failed to start file system observer: {e}", exc_info=True)
-             logger.error("Falling back to simple polling (less efficient).")
-             observer = None # Disable observer logic
-    else:
-         observer = None # Watchdog not installed
-         logger.warning("Using polling for signal files (install 'watchdog' for better performance).")
-
+    # --- Signal Listeners ---
+    try:
+        signal_watcher = InotifyWatcher(signal_dir, names=SIGNAL_NAMES)
+        logger.info(f"Watching {signal_dir} for signal files (inotify).")
+        control_fd = open_control_fifo()
+        logger.info(f"Listening for control signals on {control_fifo}.")
+    except OSError as e:
+        logger.critical(f"Failed to set up signal listeners in {signal_dir}: {e}")
+        keep_running = False
+        return 1
 
     # --- Main Loop ---
-    # Use GLib main loop if available for better integration (e.g., idle_add)
-    # Otherwise, use a simple polling loop.
+    # Use GLib main loop if available for better integration (e.g., clipboard ownership),
+    # otherwise block in epoll on the same fds. Either way the main thread sleeps
+    # until the kernel reports a control byte, signal file or finished transcription,
+    # and dispatches it inline with no cross-thread hop.
     main_loop = None
     if gi_available:
         main_loop = GLib.MainLoop()
+        # Plain fd sources: no GIOChannel wrapper per watch
+        GLib.unix_fd_add_full(GLib.PRIORITY_DEFAULT, signal_watcher.fileno(), GLib.IOCondition.IN, handle_signal_events)
+        GLib.unix_fd_add_full(GLib.PRIORITY_DEFAULT, control_fd, GLib.IOCondition.IN, handle_control_fifo)
+        GLib.unix_fd_add_full(GLib.PRIORITY_DEFAULT, output_pipe_r, GLib.IOCondition.IN, handle_output_pipe)
         # Add signal handlers for GLib loop quit
         GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGINT, main_loop.quit)
         GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, main_loop.quit)
+        for signum in CONTROL_SIGNALS:
+            GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, handle_control_signal, signum)
         logger.info("Running with GLib main loop.")
         try:
             main_loop.run() # Blocks here until loop.quit()
@@ -272,25 +400,29 @@ def main_service():
              # Call shutdown handler explicitly if loop exited unexpectedly
              if keep_running: shutdown_handler(signal.SIGTERM, None)
 
-    else: # Fallback polling loop if GLib/GI not available
-        logger.info("Running with basic polling loop (GLib not available).")
+    else: # epoll loop if GLib/GI not available
+        logger.info("Running with epoll loop (GLib not available).")
+        handlers = {control_fd: handle_control_fifo, signal_watcher.fileno(): handle_signal_events,
+                    output_pipe_r: handle_output_pipe}
+        ep = select.epoll()
+        for fd in (shutdown_event_fd, *handlers):
+            ep.register(fd, select.EPOLLIN)
         try:
-            while keep_running:
-                if os.path.exists(start_signal_file):
-                    logger.info("(Polling) Start signal detected.")
-                    handle_start_resume_signal()
-                    safe_remove(start_signal_file)
-                if os.path.exists(stop_signal_file):
-                    logger.info("(Polling) Stop signal detected.")
-                    handle_pause_signal()
-                    safe_remove(stop_signal_file)
-                time.sleep(0.25) # Poll interval
+            # One blocking wait for everything; shutdown_handler ends it through the eventfd
+            running = True
+            while running:
+                for fd, _ in ep.poll():
+                    if fd == shutdown_event_fd:
+                        running = False
+                        break
+                    handlers[fd]()
         except KeyboardInterrupt:
-            logger.info("Polling loop interrupted.")
+            logger.info("Epoll loop interrupted.")
             # Call shutdown handler explicitly
             if keep_running: shutdown_handler(signal.SIGINT, None)
         finally:
-            logger.info("Polling loop finished.")
+            ep.close()
+            logger.info("Epoll loop finished.")
 
 
     # --- Cleanup ---
@@ -300,7 +432,9 @@ def main_service():
          transcription_thread.join(timeout=2.0)
          if transcription_thread.is_alive(): logger.warning("Transcription worker did not exit.")
 
-    safe_remove(pid_file)
+    signal_watcher.close()
+    os.close(control_fd)
+    safe_remove(control_fifo)
     logger.info(f"{cfg.APP_NAME} Service Stopped.")
     return 0
 
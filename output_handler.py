@@ -1,13 +1,13 @@
 import pyperclip
+import functools
 import logging
 import os
 import time
-import re # Import regex
 import subprocess # To run shell commands
 import shlex # To parse shell commands safely
 from datetime import datetime # For new note filenames
 import config_manager as cfg
-from utils import send_notification, logger, run_command # Import run_command
+from utils import send_notification, logger
 
 # Conditional import for pynput (remains the same)
 try:
@@ -17,126 +17,155 @@ except ImportError:
     logger.warning("pynput library not found. 'type' output method will not work.")
     pynput_available = False
 
+@functools.cache
+def get_keyboard():
+    """The shared pynput keyboard, created on first use.
+
+    Creating one opens a display/uinput connection, so it is done once rather than
+    per transcription (and not at import). A failed attempt isn't cached and is retried.
+    """
+    return KeyboardController()
+
+# --- Clipboard ---
+@functools.cache
+def get_native_clipboard():
+    """GTK's CLIPBOARD selection on X11, or None to use pyperclip.
+
+    Owning the selection in-process replaces pyperclip's xclip fork+exec per copy;
+    requests for it are answered by the service's GLib main loop. Not used on
+    Wayland, where GTK3 can only set the clipboard from a focused window.
+    """
+    if os.environ.get('WAYLAND_DISPLAY') or not os.environ.get('DISPLAY'):
+        return None
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import Gtk, Gdk
+        return Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
+    except Exception as e: # ImportError, ValueError (no Gtk 3), or no display
+        logger.debug("Native clipboard unavailable, using pyperclip: %s", e)
+        return None
+
+def copy_to_clipboard(text):
+    """Copies `text`, in-process when running inside the GLib main loop, else through pyperclip."""
+    clipboard = get_native_clipboard()
+    if clipboard is not None:
+        from gi.repository import GLib
+        if GLib.main_depth() > 0: # Someone is there to answer selection requests
+            clipboard.set_text(text, -1) # The service keeps owning it until the next copy
+            return
+    pyperclip.copy(text)
+
 # --- Command Processing Logic ---
+# Commands are matched by cfg.match_command(), which compiles the [Commands] regexes
+# (and their combined alternation) once per version of the config file.
 
-def load_commands_from_config():
-    """Loads command definitions from the [Commands] section."""
-    commands = []
-    if cfg.config.has_section('Commands'):
-        for trigger_name, value in cfg.config.items('Commands'):
-            try:
-                # Split pattern and action using ':::' as separator
-                pattern_str, action_str = value.split(':::', 1)
-                pattern_str = pattern_str.strip()
-                action_str = action_str.strip()
-
-                # Compile regex (case-insensitive)
-                pattern = re.compile(pattern_str, re.IGNORECASE)
-
-                commands.append({'name': trigger_name, 'regex': pattern, 'action': action_str})
-                logger.info(f"Loaded command '{trigger_name}': Pattern='{pattern_str}', Action='{action_str}'")
-            except ValueError:
-                logger.error(f"Invalid format for command '{trigger_name}' in config. Skipping. Use 'regex ::: action'.")
-            except re.error as e:
-                 logger.error(f"Invalid regex for command '{trigger_name}': {e}. Skipping.")
-    return commands
-
-# Load commands when module is loaded
-COMMANDS = load_commands_from_config()
-
-def execute_command_action(action_str, match_groups, full_text):
-    """Executes the action defined for a matched command."""
-    logger.info(f"Executing action: {action_str}")
-    success = False
-    message = f"Action '{action_str}' triggered." # Default success message
+def _open_note(filepath, mode):
+    """Opens a note file, creating its directory only when the open finds it missing."""
+    try:
+        return open(filepath, mode, encoding='utf-8')
+    except FileNotFoundError:
+        directory = os.path.dirname(filepath)
+        if not directory:
+            raise
+        os.makedirs(directory, exist_ok=True)
+        return open(filepath, mode, encoding='utf-8')
 
+def _new_note(command, match_groups):
+    """NEW_NOTE::<directory> action. Returns (success, message)."""
+    directory = command['target'] # Expanded at config load
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    filename = f"note_{timestamp}.md" # Or .txt
+    filepath = os.path.join(directory, filename)
     try:
-        # --- Special Actions ---
-        if action_str.startswith('NEW_NOTE::'):
-            directory = os.path.expanduser(action_str.split('::', 1)[1])
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"note_{timestamp}.md" # Or .txt
-            filepath = os.path.join(directory, filename)
-            try:
-                os.makedirs(directory, exist_ok=True)
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    # Optionally add matched text or leave blank? Add placeholder.
-                    note_content = match_groups[0] if match_groups else "New note created via voice."
-                    f.write(f"# Note - {timestamp}\n\n")
-                    f.write(note_content + "\n") # Write captured group if exists
-                logger.info(f"Created new note: {filepath}")
-                message = f"New note created: {filename}"
-                success = True
-            except IndexError: # No capture group for content
-                 with open(filepath, 'w', encoding='utf-8') as f:
-                      f.write(f"# Note - {timestamp}\n\n")
-                 logger.info(f"Created new empty note: {filepath}")
-                 message = f"New empty note created: {filename}"
-                 success = True
-            except IOError as e:
-                logger.error(f"Failed to create new note {filepath}: {e}")
-                message = f"Error creating note: {e}"
-            except Exception as e:
-                 logger.error(f"Unexpected error creating note: {e}")
-                 message = f"Error creating note: {e}"
-
-
-        elif action_str.startswith('APPEND_NOTE::'):
-            filepath = os.path.expanduser(action_str.split('::', 1)[1])
-            if not match_groups:
-                logger.error(f"APPEND_NOTE action requires a capture group in regex for content.")
-                message = "Error: APPEND_NOTE needs text."
-            else:
-                content_to_append = match_groups[0].strip()
-                try:
-                    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                    with open(filepath, 'a', encoding='utf-8') as f:
-                        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                        f.write(f"[{timestamp}] {content_to_append}\n")
-                    logger.info(f"Appended to note: {filepath}")
-                    message = f"Note appended to {os.path.basename(filepath)}"
-                    success = True
-                except IOError as e:
-                    logger.error(f"Failed to append to note {filepath}: {e}")
-                    message = f"Error appending note: {e}"
-                except Exception as e:
-                    logger.error(f"Unexpected error appending note: {e}")
-                    message = f"Error appending note: {e}"
-
-        # --- Shell Command Action ---
+        with _open_note(filepath, 'w') as f:
+            # Optionally add matched text or leave blank? Add placeholder.
+            note_content = match_groups[0] if match_groups else "New note created via voice."
+            f.write(f"# Note - {timestamp}\n\n{note_content}\n") # Write captured group if exists
+        logger.info(f"Created new note: {filepath}")
+        return True, f"New note created: {filename}"
+    except IOError as e:
+        logger.error(f"Failed to create new note {filepath}: {e}")
+        return False, f"Error creating note: {e}"
+    except Exception as e:
+        logger.error(f"Unexpected error creating note: {e}")
+        return False, f"Error creating note: {e}"
+
+def _append_note(command, match_groups):
+    """APPEND_NOTE::<file> action; appends the first capture group. Returns (success, message)."""
+    filepath = command['target'] # Expanded at config load
+    if not match_groups:
+        logger.error(f"APPEND_NOTE action requires a capture group in regex for content.")
+        return False, "Error: APPEND_NOTE needs text."
+    content_to_append = match_groups[0].strip()
+    try:
+        with _open_note(filepath, 'a') as f:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"[{timestamp}] {content_to_append}\n")
+        logger.info(f"Appended to note: {filepath}")
+        return True, f"Note appended to {os.path.basename(filepath)}"
+    except IOError as e:
+        logger.error(f"Failed to append to note {filepath}: {e}")
+        return False, f"Error appending note: {e}"
+    except Exception as e:
+        logger.error(f"Unexpected error appending note: {e}")
+        return False, f"Error appending note: {e}"
+
+def _run_shell_action(command, match_groups):
+    """Shell command action, launched in the background. Returns (success, message).
+
+    `command['argv']` is the action pre-split at config load; when set, the command is
+    exec'd directly with each argument formatted separately, instead of via /bin/sh.
+    """
+    action_str = command['action']
+    argv = command['argv']
+    # Format the command string with captured groups
+    try:
+        formatted_action = action_str.format(*match_groups)
+        if argv is not None:
+            # Each captured group becomes (part of) one argument: spoken text is never parsed as shell syntax
+            argv = [arg.format(*match_groups) for arg in argv]
+    except IndexError:
+        logger.error(f"Regex for action '{action_str}' matched, but has fewer capture groups than format specifiers. Using full text.")
+        # Fallback: maybe use the whole text if formatting fails? Risky.
+        # Or just run the command without arguments if format fails.
+        formatted_action = action_str # Run command as is
+
+    logger.info(f"Running shell command: {formatted_action}")
+    try:
+        # Use subprocess.Popen for non-blocking execution. Output goes to /dev/null: nothing
+        # reads it, and a PIPE nobody drains eventually blocks the child. Own session so
+        # stopping the service doesn't take launched apps with it.
+        popen_kwargs = dict(stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            close_fds=False, start_new_session=True) # Our fds are non-inheritable anyway
+        if argv is not None:
+            # Plain command (split at config load): exec it directly, no /bin/sh in between
+            process = subprocess.Popen(argv, **popen_kwargs)
         else:
-            # Format the command string with captured groups
-            try:
-                formatted_action = action_str.format(*match_groups)
-            except IndexError:
-                logger.error(f"Regex for action '{action_str}' matched, but has fewer capture groups than format specifiers. Using full text.")
-                # Fallback: maybe use the whole text if formatting fails? Risky.
-                # Or just run the command without arguments if format fails.
-                formatted_action = action_str # Run command as is
-
-            logger.info(f"Running shell command: {formatted_action}")
-            try:
-                # Use subprocess.Popen for non-blocking execution
-                # Use shlex.split to handle arguments/quotes safely IF the command isn't complex shell syntax
-                # For complex shell syntax (pipes, redirects), use shell=True WITH CAUTION
-                # Simple case (command and args):
-                # args = shlex.split(formatted_action)
-                # process = subprocess.Popen(args)
-
-                # Safer for general commands, allows basic shell features if needed, but less safe:
-                process = subprocess.Popen(formatted_action, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                # We don't wait for completion here, just launch it
-                logger.info(f"Launched command in background (PID: {process.pid})")
-                message = f"Command '{formatted_action}' launched."
-                success = True
+            # Pipes, redirects, variables, globs etc. need the shell
+            process = subprocess.Popen(formatted_action, shell=True, **popen_kwargs)
+        # We don't wait for completion here, just launch it
+        logger.info(f"Launched command in background (PID: {process.pid})")
+        return True, f"Command '{formatted_action}' launched."
+    except Exception as e:
+        logger.error(f"Failed to run shell command '{formatted_action}': {e}")
+        return False, f"Error running command: {e}"
 
-            except Exception as e:
-                logger.error(f"Failed to run shell command '{formatted_action}': {e}")
-                message = f"Error running command: {e}"
+# Handler per action kind; the kind and its target are decoded once in cfg.get_commands()
+_ACTION_HANDLERS = {
+    'new_note': _new_note,
+    'append_note': _append_note,
+    'shell': _run_shell_action,
+}
 
+def execute_command_action(command, match_groups, full_text):
+    """Executes the action of a command from cfg.get_commands() and notifies the result."""
+    logger.info(f"Executing action: {command['action']}")
+    try:
+        success, message = _ACTION_HANDLERS[command['kind']](command, match_groups)
     except Exception as e:
-        logger.error(f"Error processing action string '{action_str}': {e}")
-        message = "Internal error processing action."
+        logger.error(f"Error processing action string '{command['action']}': {e}")
+        success, message = False, "Internal error processing action."
 
     # Send notification about the action result
     send_notification(
@@ -148,6 +177,31 @@ def execute_command_action(action_str, match_groups, full_text):
     return success
 
 
+# --- Output File ---
+# Raw O_APPEND fd kept open between transcriptions, written with one os.write() per
+# entry (no Python buffering). Reopened if output_file changes or the file was
+# moved/deleted, which one stat() per write detects.
+_OUTPUT_FILE = {'setting': None, 'path': None, 'fd': None, 'ino': None}
+
+def _output_fd(setting):
+    """(expanded path, open append fd) for the [Output] output_file value `setting`."""
+    if setting == _OUTPUT_FILE['setting'] and _OUTPUT_FILE['fd'] is not None:
+        try:
+            if os.stat(_OUTPUT_FILE['path']).st_ino == _OUTPUT_FILE['ino']:
+                return _OUTPUT_FILE['path'], _OUTPUT_FILE['fd']
+        except FileNotFoundError:
+            pass
+    if _OUTPUT_FILE['fd'] is not None:
+        os.close(_OUTPUT_FILE['fd'])
+        _OUTPUT_FILE['fd'] = None
+    filepath = os.path.expanduser(setting)
+    directory = os.path.dirname(filepath)
+    if directory: # A bare file name lives in the working directory
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(filepath, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    _OUTPUT_FILE.update(setting=setting, path=filepath, fd=fd, ino=os.fstat(fd).st_ino)
+    return filepath, fd
+
 # --- Main Handler ---
 def handle_output(text):
     """Checks text for commands, executes if match, otherwise uses default output method."""
@@ -160,13 +214,12 @@ def handle_output(text):
 
     # --- Check Commands ---
     command_executed = False
-    for command in COMMANDS:
-        match = command['regex'].fullmatch(text.strip()) # Use fullmatch for stricter matching
-        if match:
-            logger.info(f"Matched command '{command['name']}'")
-            command_executed = execute_command_action(command['action'], match.groups(), text.strip())
-            # Stop after the first match
-            break
+    stripped = text.strip()
+    matched = cfg.match_command(stripped) # First command whose regex fullmatches, via one combined regex
+    if matched:
+        name, command, groups = matched
+        logger.info(f"Matched command '{name}'")
+        command_executed = execute_command_action(command, groups, stripped)
 
     # --- Default Action if No Command Matched ---
     if not command_executed:
@@ -174,7 +227,7 @@ def handle_output(text):
         default_method = cfg.get_setting('Output', 'method').lower()
         if default_method == 'clipboard':
             try:
-                pyperclip.copy(text)
+                copy_to_clipboard(text)
                 logger.info("Text copied to clipboard.")
                 send_notification("ASR Result", "Text Copied", icon_name_cfg_key='success')
             except Exception as e:
@@ -194,10 +247,8 @@ def handle_output(text):
             try:
                 logger.info("Typing text...")
                 time.sleep(0.2) # Delay to focus window
-                keyboard = KeyboardController()
-                for char in text:
-                     keyboard.type(char)
-                     time.sleep(0.005)
+                keyboard = get_keyboard()
+                keyboard.type(text) # One call for the whole string, no per-character sleeps
                 logger.info("Finished typing text.")
             except Exception as e:
                 logger.error(f"Failed to type text: {e}", exc_info=True)
@@ -210,12 +261,9 @@ def handle_output(text):
                 send_notification("Config Error", "output_file not set for file method.", icon_name_cfg_key='error')
                 return
             try:
-                filepath = os.path.expanduser(filepath)
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                with open(filepath, 'a', encoding='utf-8') as f:
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    f.write(f"\n--- {timestamp} ---\n")
-                    f.write(text + "\n")
+                filepath, fd = _output_fd(filepath)
+                timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+                os.write(fd, f"\n--- {timestamp} ---\n{text}\n".encode('utf-8')) # One appending write
                 logger.info(f"Text appended to file: {filepath}")
                 send_notification("ASR Result", f"Text saved to {os.path.basename(filepath)}", icon_name_cfg_key='success')
             except Exception as e:
@@ -0,0 +1,193 @@
+import queue
+import threading
+import numpy as np
+
+# Single-producer/single-consumer ring buffers.
+# The producer only ever advances the write counter and the consumer only ever
+# advances the read counter. Each counter is a plain int owned by one thread and
+# a store of a Python object reference is atomic under the GIL, so neither side
+# takes a lock. Counters grow monotonically; positions are taken modulo capacity.
+
+class SampleRing:
+    """Fixed-capacity SPSC ring of float32 samples (e.g. audio callback -> VAD thread).
+
+    `history` extra samples behind the read position are never overwritten by the
+    producer, so the consumer can look back at audio it has already read (see history()).
+    """
+
+    def __init__(self, capacity, history=0):
+        self._buf = np.zeros(capacity + history, dtype=np.float32)
+        self._size = capacity + history # Physical size
+        self._capacity = capacity # Most samples that may be unread at once
+        self._history = history
+        self._write = 0 # Total samples written (producer only)
+        self._read = 0 # Total samples read (consumer only)
+
+    def __len__(self):
+        """Number of samples written but not yet read."""
+        return self._write - self._read
+
+    def reserve(self, n):
+        """Producer side: returns views of the next `n` free samples (one, or two if they wrap), or None if there is no room.
+
+        Fill the views in place and then call commit(n); nothing is visible to the consumer before that.
+        """
+        if self._capacity - (self._write - self._read) < n:
+            return None
+        pos = self._write % self._size
+        first = min(n, self._size - pos)
+        if first == n:
+            return (self._buf[pos:pos + n],)
+        return (self._buf[pos:], self._buf[:n - first])
+
+    def commit(self, n):
+        """Producer side: publishes `n` samples filled in through reserve()."""
+        self._write += n
+
+    def write(self, samples):
+        """Producer side: copies samples in. Returns False, dropping them, if there is no room."""
+        views = self.reserve(len(samples))
+        if views is None:
+            return False
+        start = 0
+        for view in views:
+            view[:] = samples[start:start + len(view)]
+            start += len(view)
+        self.commit(len(samples)) # Publish only after the copy is complete
+        return True
+
+    def read_into(self, out):
+        """Consumer side: fills `out` with the oldest unread samples. Returns False if too few are buffered."""
+        n = len(out)
+        if self._write - self._read < n:
+            return False
+        pos = self._read % self._size
+        first = min(n, self._size - pos)
+        out[:first] = self._buf[pos:pos + first]
+        if first < n:
+            out[first:] = self._buf[:n - first]
+        self._read += n # Release the space only after the copy is complete
+        return True
+
+    def history(self, count, offset=0):
+        """Consumer side: the `count` already-read samples ending `offset` samples before the read position.
+
+        Returns a tuple of one view, or two if the span wraps around the buffer. Fewer
+        samples are returned if less than that has been read or kept as history.
+        """
+        end = self._read - offset
+        count = max(0, min(count, end, self._history - offset))
+        if not count:
+            return ()
+        start = (end - count) % self._size
+        stop = start + count
+        if stop <= self._size:
+            return (self._buf[start:stop],)
+        return (self._buf[start:], self._buf[:stop - self._size])
+
+    def clear(self):
+        """Discards buffered samples. Only safe while the producer is stopped."""
+        self._write = 0
+        self._read = 0
+
+class ObjectRing:
+    """Fixed-capacity SPSC queue of object references (e.g. VAD thread -> transcription thread).
+
+    put() never blocks: when the ring is full the new item is dropped and put()
+    returns False, since the producer may not advance the consumer's counter.
+    get() mirrors queue.Queue.get and raises queue.Empty on timeout, or at once
+    when the ring is empty after close().
+    Capacity is rounded up to a power of two so slots are found with a mask.
+    """
+
+    def __init__(self, capacity):
+        capacity = 1 << max(0, capacity - 1).bit_length()
+        self._slots = [None] * capacity
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._write = 0 # Total items put (producer only)
+        self._read = 0 # Total items taken (consumer only)
+        self._ready = threading.Event() # Set by the producer when the ring becomes non-empty
+        self._closed = False
+
+    def __len__(self):
+        """Number of items put but not yet taken."""
+        return self._write - self._read
+
+    def put(self, item):
+        """Producer side: appends an item. Returns False, dropping it, if the ring is full."""
+        if self._write - self._read >= self._capacity:
+            return False
+        self._slots[self._write & self._mask] = item
+        self._write += 1 # Publish only after the slot is filled
+        # Only an empty ring can have a consumer waiting on it, so later puts in a
+        # burst skip the Event's lock and notify.
+        if self._write - self._read == 1:
+            self._ready.set()
+        return True
+
+    def close(self):
+        """Wakes a consumer blocked in get() for good, e.g. at shutdown. Items already put can still be taken."""
+        self._closed = True
+        self._ready.set()
+
+    def get(self, timeout=None):
+        """Consumer side: removes and returns the oldest item, waiting up to `timeout` seconds."""
+        if self._write == self._read:
+            self._ready.clear()
+            # Re-check so a put or close() between the test and clear() is not missed
+            if self._write == self._read and not self._closed:
+                self._ready.wait(timeout)
+            if self._write == self._read:
+                raise queue.Empty
+        pos = self._read & self._mask
+        item = self._slots[pos]
+        self._slots[pos] = None # Don't keep the item alive from the ring
+        self._read += 1
+        return item
+
+class SegmentRing:
+    """SPSC arena of contiguous float32 segments (e.g. VAD thread -> transcription thread).
+
+    The producer reserve()s a contiguous view large enough for its longest segment,
+    fills a prefix of it in place and commit()s that length. The filled prefix is
+    handed to the consumer as a view into the arena, so segments are neither
+    allocated nor copied. The consumer release()s segments in commit order once it
+    is done with them; until then the producer won't reserve over them.
+    """
+
+    def __init__(self, capacity):
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self._capacity = capacity
+        self._write = 0 # End of the last committed segment (producer only)
+        self._read = 0 # End of the last released segment (consumer only)
+        self._start = 0 # Start of the current reservation (producer only)
+
+    def reserve(self, n):
+        """Producer side: a view of `n` contiguous free samples, or None if there is no room.
+
+        A reservation that would wrap starts at the beginning of the buffer instead;
+        the skipped tail is reclaimed when the segment before it is released.
+        """
+        start = self._write
+        pos = start % self._capacity
+        if pos + n > self._capacity:
+            start += self._capacity - pos
+            pos = 0
+        if start + n - self._read > self._capacity:
+            return None
+        self._start = start
+        return self._buf[pos:pos + n]
+
+    def commit(self, n):
+        """Producer side: keeps the first `n` samples of the reservation. Returns the token to release() them with."""
+        self._write = self._start + n
+        return self._write
+
+    def uncommit(self):
+        """Producer side: takes back the segment just committed, e.g. when it couldn't be handed off."""
+        self._write = self._start
+
+    def release(self, token):
+        """Consumer side: frees the segment commit() returned `token` for, and all earlier ones."""
+        self._read = token
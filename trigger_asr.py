@@ -2,31 +2,72 @@
 import sys
 import os
 import logging
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - TRIGGER - %(message)s')
+import signal
 
 signal_dir = '/tmp'
 
 pid_file = os.path.join(signal_dir, "asr_service.pid")
+control_fifo = os.path.join(signal_dir, "asr_control.fifo")
+CONTROL_CODES = {'start': b'\x01', 'stop': b'\x02'} # Must match CONTROL_START/CONTROL_STOP in main.py
+CONTROL_SIGNALS = {'start': signal.SIGUSR1, 'stop': signal.SIGUSR2} # Must match CONTROL_SIGNALS in main.py
+SIGNAL_FILES = {'start': "asr_start_signal", 'stop': "asr_stop_signal"}
+
+def send_control(code):
+    """Writes a one-byte code to the service's control FIFO. Returns False if nothing is listening."""
+    try:
+        # O_NONBLOCK makes the open fail with ENXIO instead of hanging when no service has the FIFO open
+        fd = os.open(control_fifo, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as e:
+        logging.warning(f"Control FIFO {control_fifo} not available ({e.strerror}). Is the service running?")
+        return False
+    try:
+        os.write(fd, code)
+    except OSError as e:
+        logging.error(f"Error writing to control FIFO {control_fifo}: {e}")
+        return False
+    finally:
+        os.close(fd)
+    return True
+
+def send_signal(signum):
+    """Sends `signum` to the service named in pid_file. Returns False if it isn't running."""
+    try:
+        with open(pid_file, 'rb') as f:
+            pid = int(f.read())
+        # A stale PID may now belong to an unrelated process, which SIGUSR1 would terminate
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            if b'main.py' not in f.read():
+                return False
+        os.kill(pid, signum)
+    except (OSError, ValueError): # No/garbage PID file, or the process is gone (ESRCH)
+        return False
+    logging.info(f"Sent {signum.name} to the service (PID {pid}).")
+    return True
 
 def create_signal(signal_name):
     signal_file = os.path.join(signal_dir, signal_name)
     logging.info(f"Creating signal file: {signal_file}")
     try:
-        if not os.path.exists(pid_file):
-            logging.warning("Main ASR service PID file not found. Is it running?")
-
-        with open(signal_file, 'w') as f:
-            f.write('trigger')
-    except IOError as e:
+        # No PID file probe first: without --compat, send_control() has already warned
+        # if the service isn't running, and the create below is all the service needs.
+        fd = os.open(signal_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644) # No Python file object for 7 bytes
+        try:
+            os.write(fd, b'trigger')
+        finally:
+            os.close(fd)
+    except OSError as e:
         logging.error(f"Error creating signal file {signal_file}: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == 'start':
-        create_signal("asr_start_signal")
-    elif len(sys.argv) > 1 and sys.argv[1] == 'stop':
-        create_signal("asr_stop_signal")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - TRIGGER - %(message)s')
+    args = sys.argv[1:]
+    compat = '--compat' in args # Use the legacy signal files only
+    if compat: args.remove('--compat')
+    if len(args) == 1 and args[0] in CONTROL_CODES:
+        action = args[0]
+        if compat or not (send_control(CONTROL_CODES[action]) or send_signal(CONTROL_SIGNALS[action])):
+            create_signal(SIGNAL_FILES[action]) # Picked up by the service's inotify watch
     else:
-        print(f"Usage: {sys.argv[0]} [start|stop]")
+        print(f"Usage: {sys.argv[0]} [--compat] [start|stop]")
         sys.exit(1)
-    sys.exit(0)
\ No newline at end of file
+    sys.exit(0)
@@ -1,75 +1,201 @@
+import atexit
 import subprocess
+import functools
 import logging
+import os
+import threading
+import time
+from collections import deque
 import config_manager as cfg # Use alias for clarity
 
-# Configure logging (will be configured by main.py, but set basic here as fallback)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Handlers are set up by main.py; library modules only get loggers
 logger = logging.getLogger(cfg.APP_NAME) # Use consistent logger name
 
 notify_send_available = False # This will be set by main.py after checking
 
+# show_notifications and resolved icon names, read once per config version instead of
+# per notification (cfg.VALUES stats the config file on every access). The flag is a
+# plain global so a disabled send_notification is one global load and a branch.
+_notifications_enabled = None # Unknown until the first notification after a (re)load
+_NOTIFY_CACHE = {'icons': {}}
+
+def invalidate_notification_cache():
+    """Drops the cached notification settings; called by config_manager on reload."""
+    global _notifications_enabled
+    _notifications_enabled = None
+    _NOTIFY_CACHE['icons'].clear()
+
+cfg.add_reload_callback(invalidate_notification_cache)
+
+# --- D-Bus notifications ---
+# Notifications go straight to org.freedesktop.Notifications over one shared session
+# bus connection (Gio, from PyGObject) instead of forking notify-send for each one.
+# notify-send remains the fallback when there is no gi or no session bus.
+NOTIFICATIONS_BUS_NAME = 'org.freedesktop.Notifications'
+NOTIFICATIONS_PATH = '/org/freedesktop/Notifications'
+_URGENCY_LEVELS = {'low': 0, 'normal': 1, 'critical': 2}
+
+@functools.cache
+def get_notifications_bus():
+    """The session bus connection, or None to use notify-send. Connected on first use."""
+    try:
+        from gi.repository import Gio
+        return Gio.bus_get_sync(Gio.BusType.SESSION, None)
+    except Exception as e: # ImportError, or GLib.Error with no session bus
+        logger.debug("D-Bus notifications unavailable, using notify-send: %s", e)
+        return None
+
+def _notify_dbus(bus, summary, body, icon_name, urgency):
+    """Sends a Notify call without waiting for the reply (the notification id, which is unused)."""
+    from gi.repository import Gio, GLib
+    hints = {'urgency': GLib.Variant('y', _URGENCY_LEVELS.get(urgency, 1))}
+    parameters = GLib.Variant('(susssasa{sv}i)', (cfg.APP_NAME, 0, icon_name or '', summary, body, [], hints, -1))
+    bus.call(NOTIFICATIONS_BUS_NAME, NOTIFICATIONS_PATH, NOTIFICATIONS_BUS_NAME, 'Notify', parameters,
+             None, Gio.DBusCallFlags.NONE, -1, None, None, None)
+
+# --- notify-send fallback ---
+# Spawned fire-and-forget with posix_spawnp, output to /dev/null. Children are reaped
+# by PID on later sends (not by a SIGCHLD handler, which would also steal the exit
+# status of run_command's subprocesses); too many unreaped ones means the desktop
+# isn't keeping up, and further notifications are skipped until they exit.
+MAX_PENDING_NOTIFY_SEND = 8
+_NOTIFY_SEND_PREFIX = ('notify-send', '--app-name', cfg.APP_NAME) # Same for every notification
+
+@functools.lru_cache(maxsize=32)
+def _notify_send_options(icon_name, urgency):
+    """The argv up to the summary for this icon and urgency, built once per pair."""
+    return (*_NOTIFY_SEND_PREFIX, '--icon', icon_name, '--urgency', urgency) # urgency: low, normal, critical
+_notify_send_pids = set()
+_DEVNULL_STDIO = (
+    (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+    (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+    (os.POSIX_SPAWN_DUP2, 1, 2),
+)
+
+def _reap_notify_send():
+    """Reaps notify-send processes that have exited, without waiting for the rest."""
+    for pid in list(_notify_send_pids):
+        try:
+            done = os.waitpid(pid, os.WNOHANG)[0]
+        except ChildProcessError: # Already reaped
+            done = pid
+        if done:
+            _notify_send_pids.discard(pid)
+
 def set_notify_send_available(available):
     """Allows main.py to set the availability status."""
     global notify_send_available
     notify_send_available = available
 
+# --- Notification worker ---
+# send_notification only queues; one daemon thread, started on first use, delivers.
+# Each wakeup waits NOTIFY_COALESCE_S for the rest of a burst (e.g. status +
+# result) and sends identical queued notifications once. The queue keeps the
+# newest NOTIFY_QUEUE_SIZE; older ones are dropped if the desktop falls behind.
+NOTIFY_QUEUE_SIZE = 16
+NOTIFY_COALESCE_S = 0.05
+_notify_queue = deque(maxlen=NOTIFY_QUEUE_SIZE) # append/popleft are atomic, so any thread may queue
+_notify_ready = threading.Event()
+_notify_thread = None
+_notify_thread_lock = threading.Lock()
+
+def _deliver_queued_notifications():
+    """Sends everything queued, each distinct notification once."""
+    pending = {} # Insertion-ordered, so distinct notifications keep their order
+    while True:
+        try: # No emptiness check first: the worker and the atexit hook may drain concurrently
+            pending[_notify_queue.popleft()] = None
+        except IndexError:
+            break
+    for notification in pending:
+        try:
+            _deliver_notification(*notification)
+        except Exception as e:
+            logger.error("Unexpected error sending notification '%s': %s", notification[0], e)
+
+def _notification_worker():
+    while True:
+        _notify_ready.wait()
+        _notify_ready.clear()
+        time.sleep(NOTIFY_COALESCE_S)
+        _deliver_queued_notifications()
+
+atexit.register(_deliver_queued_notifications) # E.g. a startup error reported right before exiting
+
 def send_notification(summary, body="", icon_name_cfg_key='app_icon', urgency='low'):
-    """Sends desktop notification if enabled and possible."""
-    if not cfg.get_bool_setting('UI', 'show_notifications'):
-        return
+    """Queues a desktop notification if enabled; it is sent from the notification thread."""
+    global _notify_thread, _notifications_enabled
+    if not _notifications_enabled:
+        if _notifications_enabled is not None:
+            return # Disabled: the common fast path
+        _notifications_enabled = cfg.VALUES.show_notifications
+        if not _notifications_enabled:
+            return
+
+    if _notify_thread is None:
+        with _notify_thread_lock:
+            if _notify_thread is None:
+                thread = threading.Thread(target=_notification_worker, name='notifications', daemon=True)
+                thread.start()
+                _notify_thread = thread
+    _notify_queue.append((summary, body, icon_name_cfg_key, urgency))
+    _notify_ready.set()
+
+def _deliver_notification(summary, body, icon_name_cfg_key, urgency):
+    """Sends one notification over D-Bus, or with notify-send if that isn't possible."""
+    icons = _NOTIFY_CACHE['icons']
+    icon_name = icons.get(icon_name_cfg_key)
+    if icon_name is None:
+        icon_name = icons[icon_name_cfg_key] = cfg.get_setting('Icons', icon_name_cfg_key)
+
+    bus = get_notifications_bus()
+    if bus is not None:
+        try:
+            _notify_dbus(bus, summary, body, icon_name, urgency)
+            logger.debug("Sent notification over D-Bus: %s", summary)
+            return
+        except Exception as e:
+            logger.error("D-Bus notification failed for '%s', trying notify-send: %s", summary, e)
 
     if not notify_send_available:
         # Log warning only once per session perhaps? Handled by main.py's initial check now.
         # logger.warning("Cannot send notification: notify-send not available.")
         return
 
-    icon_name = cfg.get_setting('Icons', icon_name_cfg_key)
-
     # Build command - Removed --transient based on previous user feedback
-    cmd = [
-        'notify-send',
-        '--app-name', cfg.APP_NAME,
-        '--icon', icon_name,
-        '--urgency', urgency, # low, normal, critical
-        # '--transient', # Removed
-        summary
-    ]
-    if body:
-        cmd.append(body)
+    cmd = _notify_send_options(icon_name, urgency) + ((summary, body) if body else (summary,))
 
+    _reap_notify_send()
+    if len(_notify_send_pids) >= MAX_PENDING_NOTIFY_SEND:
+        logger.warning("%d notify-send processes still running, skipping: %s", len(_notify_send_pids), summary)
+        return
     try:
-        # Run detached? No, short command.
-        subprocess.run(cmd, check=True, timeout=2, capture_output=True) # Capture output to hide it
-        logger.debug(f"Sent notification: {summary}")
+        # Don't wait for it: the next queued notification may already be due
+        _notify_send_pids.add(os.posix_spawnp('notify-send', cmd, os.environ, file_actions=_DEVNULL_STDIO))
+        logger.debug("Sent notification: %s", summary)
     except FileNotFoundError:
         # Should not happen if check in main is done, but safety first
         logger.error("notify-send command not found during execution.")
         set_notify_send_available(False) # Mark as unavailable
-    except subprocess.TimeoutExpired:
-         logger.warning(f"notify-send command timed out for: {summary}")
-    except subprocess.CalledProcessError as e:
-         # Log stderr from notify-send if it failed
-         logger.error(f"notify-send failed for '{summary}': {e.stderr.decode('utf-8', errors='ignore').strip()}")
     except Exception as e:
          logger.error(f"Unexpected error sending notification '{summary}': {e}")
          
 def run_command(cmd_list):
     """Runs a command, returns stdout, handles errors."""
     try:
-        # Use capture_output=True to prevent command output unless error
-        result = subprocess.run(cmd_list, capture_output=True, text=True, check=True, timeout=5)
-        return result.stdout.strip()
+        # Raw bytes, decoded once here; stderr is captured only for the failure log
+        result = subprocess.run(cmd_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=5)
+        return result.stdout.decode('utf-8', errors='ignore').strip()
     except FileNotFoundError:
-        # Log error only if it's not the initial notify-send check failing
-        if not (cmd_list[0] == 'which' and cmd_list[1] == 'notify-send' and notify_send_available is False):
-             logger.error(f"Command not found: {cmd_list[0]}")
+        logger.error(f"Command not found: {cmd_list[0]}")
         return None
     except subprocess.CalledProcessError as e:
-         logger.debug(f"Command failed: {' '.join(cmd_list)} -> {e.stderr.decode('utf-8', errors='ignore').strip()}")
+         if logger.isEnabledFor(logging.DEBUG): # Skip decoding stderr when it won't be shown
+             logger.debug("Command failed: %s -> %s", cmd_list, e.stderr.decode('utf-8', errors='ignore').strip())
          return None
     except subprocess.TimeoutExpired:
-         logger.warning(f"Command timed out: {' '.join(cmd_list)}")
+         logger.warning("Command timed out: %s", cmd_list)
          return None
     except Exception as e:
-         logger.error(f"Unexpected error running {' '.join(cmd_list)}: {e}")
+         logger.error("Unexpected error running %s: %s", cmd_list, e)
          return None
\ No newline at end of file
@@ -0,0 +1,112 @@
+import importlib.util
+import logging
+import os
+import urllib.request
+import numpy as np
+import onnxruntime as ort
+
+MODEL_URL = 'https://github.com/snakers4/silero-vad/raw/master/src/silero_vad/data/silero_vad.onnx'
+
+# Options for execution providers that need them
+PROVIDER_OPTIONS = {
+    'CUDAExecutionProvider': {'device_id': 0, 'cudnn_conv_algo_search': 'HEURISTIC'},
+}
+
+def default_model_path(cache_dir):
+    """Returns a local path to the Silero VAD ONNX model without importing torch.
+
+    Uses the copy bundled with the silero-vad package if it is installed (located via
+    its import spec, since importing the package pulls in torch), otherwise downloads
+    the model once into `cache_dir`.
+    """
+    spec = importlib.util.find_spec('silero_vad')
+    if spec and spec.submodule_search_locations:
+        bundled = os.path.join(spec.submodule_search_locations[0], 'data', 'silero_vad.onnx')
+        if os.path.exists(bundled):
+            return bundled
+
+    cached = os.path.join(cache_dir, 'silero_vad.onnx')
+    if not os.path.exists(cached):
+        logging.info(f"Downloading Silero VAD model to {cached}")
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cached + '.part'
+        urllib.request.urlretrieve(MODEL_URL, tmp_path)
+        os.replace(tmp_path, cached) # Never leave a truncated model behind
+    return cached
+
+def resolve_providers(requested):
+    """Filters requested ORT execution providers down to those this onnxruntime build has.
+
+    Returns (providers, provider_options) for InferenceSession. CPU is always kept as
+    the last resort so the session can be created on any machine.
+    """
+    available = ort.get_available_providers()
+    providers = []
+    for name in requested:
+        if name in available:
+            providers.append(name)
+        else:
+            logging.warning(f"ONNX Runtime provider {name} is not available (have: {', '.join(available)}). Skipping it.")
+    if 'CPUExecutionProvider' not in providers:
+        providers.append('CPUExecutionProvider')
+    return providers, [PROVIDER_OPTIONS.get(name, {}) for name in providers]
+
+class SileroVAD:
+    """Silero VAD (v5/v6 ONNX export, float or int8) on an explicitly configured ONNX Runtime session.
+
+    Calling the object with one frame returns its speech probability. The
+    recurrent state and the audio context the model expects in front of each
+    window are carried between calls, like the torch.hub OnnxWrapper does.
+    """
+
+    # Window sizes (samples) the v5 model accepts, and the context prepended to each window
+    WINDOW_SIZES = {16000: 512, 8000: 256}
+    CONTEXT_SIZES = {16000: 64, 8000: 32}
+
+    def __init__(self, model_path, sample_rate=16000, providers=('CPUExecutionProvider',)):
+        if sample_rate not in self.WINDOW_SIZES:
+            raise ValueError(f"Silero VAD supports 8000 or 16000Hz audio, got {sample_rate}")
+
+        # The model is tiny and runs every frame: a single sequential thread has the
+        # lowest latency, and ORT's default of one thread per core only adds scheduling churn.
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = 1
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers, provider_options = resolve_providers(providers)
+        self.session = ort.InferenceSession(model_path, sess_options=opts,
+                                            providers=providers, provider_options=provider_options)
+        # v5, v6 and the int8 re-exports share the (audio, state, sr) signature but not always
+        # the input names, so bind them by position
+        inputs = [i.name for i in self.session.get_inputs()]
+        if len(inputs) != 3:
+            raise ValueError(f"{model_path} does not look like a Silero VAD v5/v6 model (inputs: {inputs})")
+        self._input_name, self._state_name, self._sr_name = inputs
+
+        self.sample_rate = sample_rate
+        self.window_size = self.WINDOW_SIZES[sample_rate]
+        self._context_size = self.CONTEXT_SIZES[sample_rate]
+        self._sr = np.array(sample_rate, dtype=np.int64)
+        self.reset_states()
+        # One dummy window so ORT's first-run setup happens now rather than on the first audio frame
+        self(np.zeros(self.window_size, dtype=np.float32))
+        self.reset_states()
+
+    def reset_states(self):
+        """Clears the recurrent state and audio context, e.g. between utterances."""
+        # Reused model input: [context | window]. The context slot holds the tail of the previous window.
+        self._input = np.zeros((1, self._context_size + self.window_size), dtype=np.float32)
+        # The recurrent state lives in the feeds dict and is replaced by each run's output
+        self._feeds = {self._input_name: self._input,
+                       self._state_name: np.zeros((2, 1, 128), dtype=np.float32),
+                       self._sr_name: self._sr}
+
+    def __call__(self, frame):
+        """Returns the speech probability (0.0-1.0) of one `window_size` frame."""
+        x = self._input
+        x[0, self._context_size:] = frame # Copied into the preallocated input, no per-call concatenate
+        feeds = self._feeds
+        out, feeds[self._state_name] = self.session.run(None, feeds)
+        x[0, :self._context_size] = x[0, -self._context_size:] # Carry the context to the next call
+        return float(out[0, 0])